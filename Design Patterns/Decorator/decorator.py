@@ -81,51 +81,111 @@ class CondimentDecorator(Beverage):
 
 
 class Milk(CondimentDecorator):
+    name = "Milk"
+    price = .10
 
     def __init__(self, beverage):
         self._beverage = beverage
 
     def get_description(self):
-        return self._beverage.get_description() + ", Milk"
+        return self._beverage.get_description() + ", " + self.name
 
     def cost(self):
-        return .10 + self._beverage.cost()
+        return self.price + self._beverage.cost()
 
 
 class Mocha(CondimentDecorator):
+    name = "Mocha"
+    price = .20
 
     def __init__(self, beverage):
         self._beverage = beverage
 
     def get_description(self):
-        return self._beverage.get_description() + ", Mocha"
+        return self._beverage.get_description() + ", " + self.name
 
     def cost(self):
-        return .20 + self._beverage.cost()
+        return self.price + self._beverage.cost()
 
 
 class Soy(CondimentDecorator):
+    name = "Soy"
+    price = .15
 
     def __init__(self, beverage):
         self._beverage = beverage
 
     def get_description(self):
-        return self._beverage.get_description() + ", Soy"
+        return self._beverage.get_description() + ", " + self.name
 
     def cost(self):
-        return .15 + self._beverage.cost()
+        return self.price + self._beverage.cost()
 
 
 class Whip(CondimentDecorator):
+    name = "Whip"
+    price = .10
 
     def __init__(self, beverage):
         self._beverage = beverage
 
     def get_description(self):
-        return self._beverage.get_description() + ", Whip"
+        return self._beverage.get_description() + ", " + self.name
 
     def cost(self):
-        return .10 + self._beverage.cost()
+        return self.price + self._beverage.cost()
+
+
+# Flattened beverages
+'''
+Every cost() and get_description() call on a decorated beverage walks the whole chain of wrappers,
+and the description is rebuilt by repeated concatenation.
+FlattenedBeverage.of() walks the chain once and keeps an immutable summary: the base beverage,
+the condiments (innermost first), the total cost and the description, so both calls are O(1).
+The cost is added up in the same order as the wrappers do it, so it is the exact same number.
+'''
+
+class FlattenedBeverage(Beverage):
+
+    def __init__(self, base, condiments, cost, description):
+        object.__setattr__(self, "base", base)
+        object.__setattr__(self, "condiments", tuple(condiments))
+        object.__setattr__(self, "_cost", cost)
+        object.__setattr__(self, "_description", description)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("FlattenedBeverage is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("FlattenedBeverage is immutable")
+
+    @classmethod
+    def of(cls, beverage):
+        wrappers = []
+        # condiments without a fixed name and price cannot be summarized, they stay part of the base
+        while isinstance(beverage, CondimentDecorator) and getattr(beverage, "price", None) is not None:
+            wrappers.append(type(beverage))
+            beverage = beverage._beverage
+        wrappers.reverse()
+
+        cost = beverage.cost()
+        names = [beverage.get_description()]
+        condiments = tuple(wrappers)
+        if isinstance(beverage, FlattenedBeverage):
+            # decorating a flattened beverage and flattening again extends its summary
+            condiments = beverage.condiments + condiments
+            beverage = beverage.base
+
+        for condiment in wrappers:
+            cost = condiment.price + cost
+        names.extend(condiment.name for condiment in wrappers)
+        return cls(beverage, condiments, cost, ", ".join(names))
+
+    def get_description(self):
+        return self._description
+
+    def cost(self):
+        return self._cost
 
 
 ###############################################################################
@@ -146,4 +206,7 @@ if __name__ == '__main__':
     beverage3 = Soy(beverage3)
     beverage3 = Mocha(beverage3)
     beverage3 = Whip(beverage3)
-    print(beverage3.get_description() + " $" + str(beverage3.cost()))
\ No newline at end of file
+    print(beverage3.get_description() + " $" + str(beverage3.cost()))
+
+    beverage4 = FlattenedBeverage.of(Whip(Mocha(Mocha(DarkRoast()))))
+    print(beverage4.get_description() + " $" + str(beverage4.cost()))
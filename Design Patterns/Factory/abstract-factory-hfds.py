@@ -2,6 +2,11 @@
 Final Abstract Factory Pattern
 """
 from abc import ABC, abstractmethod
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sinks
 
 # Ingredients
 
@@ -226,13 +231,13 @@ class Pizza(ABC):
         pass
 
     def bake(self):
-        print("Bake for 25 minutes at 350")
+        sinks.output.write("Bake for 25 minutes at 350")
 
     def cut(self):
-        print("Cutting the pizza into diagonal slices")
+        sinks.output.write("Cutting the pizza into diagonal slices")
 
     def box(self):
-        print("Place pizza in official PizzaStore box")
+        sinks.output.write("Place pizza in official PizzaStore box")
 
     def set_name(self, name):
         self._name = name
@@ -271,7 +276,7 @@ class CheesePizza(Pizza):
         self._ingredient_factory = ingredient_factory
 
     def prepare(self):
-        print("Preparing " + self._name)
+        sinks.output.write("Preparing " + self._name)
         self._dough = self._ingredient_factory.create_dough()
         self._sauce = self._ingredient_factory.create_sauce()
 
@@ -283,7 +288,7 @@ class ClamPizza(Pizza):
         self._ingredient_factory = ingredient_factory
 
     def prepare(self):
-        print("Preparing " + self._name)
+        sinks.output.write("Preparing " + self._name)
 
         self._cheese = self._ingredient_factory.create_cheese()
         self._dough = self._ingredient_factory.create_dough()
@@ -299,7 +304,7 @@ class PepperoniPizza(Pizza):
         self._ingredient_factory = ingredient_factory
 
     def prepare(self):
-        print("Preparing " + self._name)
+        sinks.output.write("Preparing " + self._name)
 
         self._dough = self._ingredient_factory.create_dough()
         self._sauce = self._ingredient_factory.create_sauce()
@@ -315,7 +320,7 @@ class VeggiePizza(Pizza):
         self._ingredient_factory = ingredient_factory
 
     def prepare(self):
-        print("Preparing " + self._name)
+        sinks.output.write("Preparing " + self._name)
 
         self._dough = self._ingredient_factory.create_dough()
         self._sauce = self._ingredient_factory.create_sauce()
@@ -333,7 +338,7 @@ class PizzaStore(ABC):
 
     def order_pizza(self, pizza_type):
         pizza = self.create_pizza(pizza_type)
-        print("--- Making a " + pizza.get_name() + " ---")
+        sinks.output.write("--- Making a " + pizza.get_name() + " ---")
 
         pizza.prepare()
         pizza.bake()
@@ -3,6 +3,11 @@ Abstract Factory Method for Pizza Store
 """
 
 from abc import ABC, abstractmethod
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sinks
 
 """
 Pizza - Product Class
@@ -20,20 +25,20 @@ class Pizza(ABC):
         self._toppings = []
 
     def prepare(self):
-        print("Preparing " + self._name)
-        print("Tossing dough...")
-        print("Adding sauce...")
-        print("Adding toppings: ")
-        print("   ".join(self._toppings))
+        sinks.output.write("Preparing " + self._name)
+        sinks.output.write("Tossing dough...")
+        sinks.output.write("Adding sauce...")
+        sinks.output.write("Adding toppings: ")
+        sinks.output.write("   ".join(self._toppings))
 
     def bake(self):
-        print("Bake for 25 minutes at 350")
+        sinks.output.write("Bake for 25 minutes at 350")
 
     def cut(self):
-        print("Cutting the pizza into diagonal slices")
+        sinks.output.write("Cutting the pizza into diagonal slices")
 
     def box(self):
-        print("Place pizza in official PizzaStore box")
+        sinks.output.write("Place pizza in official PizzaStore box")
 
     def get_name(self):
         return self._name
@@ -63,7 +68,7 @@ class PizzaStore(ABC):
 
     def order_pizza(self, pizza_type: str) -> Pizza:
         pizza = self.create_pizza(pizza_type)
-        print("--- Making a " + pizza.get_name() + " ---")
+        sinks.output.write("--- Making a " + pizza.get_name() + " ---")
 
         pizza.prepare()
         pizza.bake()
@@ -166,7 +171,7 @@ class ChicagoStyleCheesePizza(Pizza):
         self._toppings.append("Shredded Mozzarella Cheese")
 
     def cut(self):
-        print("Cutting the pizza into square slices")
+        sinks.output.write("Cutting the pizza into square slices")
 
 
 class ChicagoStylePepperoniPizza(Pizza):
@@ -184,7 +189,7 @@ class ChicagoStylePepperoniPizza(Pizza):
         self._toppings.append("Sliced Pepperoni")
 
     def cut(self):
-        print("Cutting the pizza into square slices")
+        sinks.output.write("Cutting the pizza into square slices")
 
 
 class ChicagoStyleClamPizza(Pizza):
@@ -199,7 +204,7 @@ class ChicagoStyleClamPizza(Pizza):
         self._toppings.append("Frozen Clams from Chesapeake Bay")
 
     def cut(self):
-        print("Cutting the pizza into square slices")
+        sinks.output.write("Cutting the pizza into square slices")
 
 
 class ChicagoStyleVeggiePizza(Pizza):
@@ -216,7 +221,7 @@ class ChicagoStyleVeggiePizza(Pizza):
         self._toppings.append("Eggplant")
 
     def cut(self):
-        print("Cutting the pizza into square slices")
+        sinks.output.write("Cutting the pizza into square slices")
 
 
 # Driver Code
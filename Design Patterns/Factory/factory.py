@@ -1,3 +1,4 @@
+from collections import namedtuple
 from enum import Enum
 from math import *
 
@@ -56,6 +57,51 @@ class PointFactory:
         return Point(rho * sin(theta), rho * cos(theta))
 
 
+# Point without a per-instance __dict__, same constructor and factory methods
+class SlottedPoint:
+    __slots__ = ('x', 'y')
+
+    def __init__(self, a, b, system=CoordinateSystem.CARTESIAN):
+        if system == CoordinateSystem.CARTESIAN:
+            self.x = a
+            self.y = b
+        elif system == CoordinateSystem.POLAR:
+            self.x = a * sin(b)
+            self.y = a * cos(b)
+
+    def __str__(self):
+        return f'x: {self.x}, y: {self.y}'
+
+    @staticmethod
+    def new_cartesian_point(x, y):
+        return SlottedPoint(x, y)
+
+    @staticmethod
+    def new_polar_point(rho, theta):
+        return SlottedPoint(rho * sin(theta), rho * cos(theta))
+
+
+# immutable and hashable, same constructor and factory methods
+class FrozenPoint(namedtuple('FrozenPoint', 'x y')):
+    __slots__ = ()
+
+    def __new__(cls, a, b, system=CoordinateSystem.CARTESIAN):
+        if system == CoordinateSystem.POLAR:
+            a, b = a * sin(b), a * cos(b)
+        return super().__new__(cls, a, b)
+
+    def __str__(self):
+        return f'x: {self.x}, y: {self.y}'
+
+    @staticmethod
+    def new_cartesian_point(x, y):
+        return FrozenPoint(x, y)
+
+    @staticmethod
+    def new_polar_point(rho, theta):
+        return FrozenPoint(rho * sin(theta), rho * cos(theta))
+
+
 if __name__ == '__main__':
     p1 = Point(2, 3, CoordinateSystem.CARTESIAN)
     p2 = PointFactory.new_cartesian_point(1, 2)
@@ -63,3 +109,4 @@ if __name__ == '__main__':
     p3 = Point.Factory.new_cartesian_point(5, 6)
     p4 = Point.factory.new_cartesian_point(7, 8)
     print(p1, p2, p3, p4)
+    print(SlottedPoint.new_polar_point(1, pi / 2), FrozenPoint.new_cartesian_point(3, 4))
@@ -5,6 +5,11 @@ Objective: Design a pizza store class following OOP.
 """
 
 from abc import ABC, abstractmethod
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sinks
 
 
 # Client of the Factory - PizzaStore goes to the PizzaFactory to get instances of Pizza 
@@ -53,16 +58,16 @@ class Pizza(ABC):
         return self._name
 
     def prepare(self):
-        print("Preparing " + self._name)
+        sinks.output.write("Preparing " + self._name)
 
     def bake(self):
-        print("Baking " + self._name)
+        sinks.output.write("Baking " + self._name)
 
     def cut(self):
-        print("Cutting " + self._name)
+        sinks.output.write("Cutting " + self._name)
 
     def box(self):
-        print("Boxing " + self._name)
+        sinks.output.write("Boxing " + self._name)
 
 
 class CheesePizza(Pizza):
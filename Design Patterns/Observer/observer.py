@@ -7,6 +7,28 @@ Our objective is to build a weather monitoring application with 3 players:
 """
 
 from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from heapq import merge
+from multiprocessing import Process, Queue, shared_memory
+import csv
+import math
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+import weakref
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sinks
+
+
+# The measurements an observer can subscribe to
+MEASUREMENTS = ('temperature', 'humidity', 'pressure')
 
 
 # Observables
@@ -18,9 +40,10 @@ This is done by executing the update method on the observers
 class Subject(ABC):
 
     @abstractmethod
-    def registerObserver(self, observer):
+    def registerObserver(self, observer, fields=None):
         """
         Observers will call this method to register themselves with a Subject
+        With fields, e.g. ('pressure',), they are only notified when one of those fields changes
         """
         pass
 
@@ -39,27 +62,148 @@ class Subject(ABC):
         pass
 
 
+class ObserverRegistry:
+    """
+    The observers registered with a Subject, in registration order, with O(1) add and discard.
+    With weak=True only weak references are kept, so observers nobody else holds on to
+    are dropped automatically once they are garbage collected.
+    Observers are identified by id(), iteration works on a snapshot and skips observers
+    discarded in the meantime, so (un)registering during a notification is safe.
+    """
+    def __init__(self, weak=False, on_collected=None):
+        self.weak = weak
+        self._entries = {}
+        self._on_collected = on_collected
+
+    def add(self, observer):
+        key = id(observer)
+        if self.get(key) is observer:
+            return False
+        if self.weak:
+            self._entries[key] = weakref.ref(observer, lambda ref, key=key: self._collected(key, ref))
+        else:
+            self._entries[key] = observer
+        return True
+
+    def _collected(self, key, ref):
+        # only if the entry still is this reference, the id may have been reused meanwhile
+        if self._entries.get(key) is ref:
+            del self._entries[key]
+            if self._on_collected is not None:
+                self._on_collected(key)
+
+    def discard(self, observer):
+        key = id(observer)
+        if self.get(key) is observer:
+            del self._entries[key]
+            return True
+        return False
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if self.weak and entry is not None:
+            entry = entry()
+        return entry
+
+    def __contains__(self, observer):
+        return self.get(id(observer)) is observer
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        for key in list(self._entries):
+            observer = self.get(key)
+            if observer is not None:
+                yield observer
+
+
 class WeatherData(Subject):
     
-    def __init__(self):
-        # A list that holds registered observers
-        self._observers = []
+    def __init__(self, weak_observers=False):
+        # The registered observers, weak_observers=True lets abandoned displays be collected
+        self._observers = ObserverRegistry(weak_observers, on_collected=self._unsubscribe)
         self._temperature = None
         self._humidity = None
         self._pressure = None
+        # Registration order by id(observer); observers that want every notification, and per
+        # field the ones subscribed to it, each kept sorted by registration order
+        self._order = {}
+        self._all_fields = {}
+        self._subscribers = {field: {} for field in MEASUREMENTS}
+        self._registered = 0
+        self._notified = None
 
-    def registerObserver(self, observer):
-        self._observers.append(observer)
+    def registerObserver(self, observer, fields=None):
+        if fields is not None:
+            for field in fields:
+                if field not in self._subscribers:
+                    raise ValueError(f'Unknown measurement {field}')
+        key = id(observer)
+        if self._observers.add(observer):
+            self._order[key] = self._registered
+            self._registered += 1
+        else:
+            # registering again only changes the subscription
+            self._unsubscribe(key, forget=False)
+        if fields is None:
+            self._subscribe(self._all_fields, key)
+        else:
+            for field in fields:
+                self._subscribe(self._subscribers[field], key)
+
+    def _subscribe(self, index, key):
+        order = self._order[key]
+        if not index or order > next(reversed(index.values())):
+            index[key] = order
+        else:
+            # only when an earlier observer changes its subscription
+            index[key] = order
+            ordered = sorted(index.items(), key=lambda item: item[1])
+            index.clear()
+            index.update(ordered)
+
+    def _unsubscribe(self, key, forget=True):
+        if forget:
+            self._order.pop(key, None)
+        self._all_fields.pop(key, None)
+        for subscribers in self._subscribers.values():
+            subscribers.pop(key, None)
 
     def removeObserver(self, observer):
-        try:
-            self._observers.remove(observer)
-        except:
-            pass
+        # removing an observer that is not registered is not an error
+        if self._observers.discard(observer):
+            self._unsubscribe(id(observer))
+
+    def _targets(self):
+        """
+        The observers to notify of the current measurements, in registration order
+        """
+        values = dict(zip(MEASUREMENTS, (self._temperature, self._humidity, self._pressure)))
+        changed = [f for f in MEASUREMENTS
+                   if self._notified is None or values[f] != self._notified[f]]
+        self._notified = values
+
+        # everyone subscribed to all fields, plus the subscribers of the fields that changed;
+        # every index is in registration order already, so they only need merging
+        indexes = [list(self._all_fields.items())]
+        indexes += [list(self._subscribers[f].items()) for f in changed if self._subscribers[f]]
+        targets = indexes[0] if len(indexes) == 1 else merge(*indexes, key=lambda item: item[1])
+
+        previous = None
+        for key, _ in targets:
+            # observers subscribed to several changed fields come up once per field
+            if key == previous:
+                continue
+            previous = key
+            # skips observers removed by an earlier update in this same notification
+            obs = self._observers.get(key)
+            if obs is not None:
+                yield obs
 
     def notifyObservers(self):
         # Every observer has an implementation of the update method with the same signature
-        for obs in self._observers:
+        for obs in self._targets():
             obs.update(self._temperature, self._humidity, self._pressure)
 
     def measurementsChanged(self):
@@ -73,6 +217,303 @@ class WeatherData(Subject):
         self.measurementsChanged()
 
 
+# Asynchronous notification
+"""
+notifyObservers calls every update() in turn, so one slow display holds up setMeasurements.
+AsyncWeatherData gives every observer its own bounded queue (a channel) and delivers from a
+thread pool instead. setMeasurements only puts the new measurements on the queues.
+When a queue is full its overflow policy decides what happens:
+- DROP_OLDEST: the oldest undelivered measurements are dropped
+- COALESCE: undelivered measurements are replaced by the latest ones (at most one pending)
+- BLOCK: setMeasurements waits until the observer catches up
+"""
+class OverflowPolicy(Enum):
+    DROP_OLDEST = 1
+    COALESCE = 2
+    BLOCK = 3
+
+
+class ObserverChannel:
+    # frames delivered per turn on a pool thread, so a busy channel does not starve the others
+    batch_size = 64
+
+    def __init__(self, observer, executor, max_queue, policy):
+        self.observer = observer
+        self.max_queue = max_queue
+        self.policy = policy
+        self._executor = executor
+        self._frames = deque()
+        self._condition = threading.Condition()
+        self._draining = False
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+
+    def publish(self, frame):
+        """
+        frame is (time published, temperature, humidity, pressure)
+        """
+        with self._condition:
+            self.published += 1
+            if self.policy == OverflowPolicy.COALESCE and self._frames:
+                # keep the time of the oldest reading so lag shows how stale the observer is
+                self._frames[-1] = (self._frames[-1][0],) + frame[1:]
+                self.coalesced += 1
+            else:
+                if len(self._frames) >= self.max_queue:
+                    if self.policy == OverflowPolicy.BLOCK:
+                        self._condition.wait_for(lambda: len(self._frames) < self.max_queue)
+                    else:
+                        self._frames.popleft()
+                        self.dropped += 1
+                self._frames.append(frame)
+            if not self._draining:
+                self._draining = True
+                self._executor.submit(self._drain)
+
+    def _drain(self):
+        for _ in range(self.batch_size):
+            with self._condition:
+                if not self._frames:
+                    self._draining = False
+                    self._condition.notify_all()
+                    return
+                published_at, temperature, humidity, pressure = self._frames.popleft()
+                self._condition.notify_all()
+            try:
+                self.observer.update(temperature, humidity, pressure)
+            except Exception:
+                with self._condition:
+                    self.errors += 1
+            lag = time.perf_counter() - published_at
+            with self._condition:
+                self.delivered += 1
+                self.total_lag += lag
+                self.max_lag = max(self.max_lag, lag)
+        # more to deliver, queue up again behind the other channels
+        self._executor.submit(self._drain)
+
+    def wait_idle(self, timeout=None):
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._draining, timeout)
+
+    def metrics(self):
+        with self._condition:
+            return {
+                'observer': type(self.observer).__name__,
+                'published': self.published,
+                'delivered': self.delivered,
+                'dropped': self.dropped,
+                'coalesced': self.coalesced,
+                'errors': self.errors,
+                'queue_depth': len(self._frames),
+                'avg_lag': self.total_lag / self.delivered if self.delivered else 0.0,
+                'max_lag': self.max_lag,
+            }
+
+
+class AsyncWeatherData(WeatherData):
+
+    def __init__(self, max_queue=64, policy=OverflowPolicy.DROP_OLDEST, max_workers=None):
+        super().__init__()
+        self.max_queue = max_queue
+        self.policy = policy
+        self._executor = ThreadPoolExecutor(max_workers)
+        self._channels = {}
+
+    def registerObserver(self, observer, fields=None, *, max_queue=None, policy=None):
+        super().registerObserver(observer, fields)
+        channel = self._channels.get(observer)
+        if channel is None:
+            self._channels[observer] = ObserverChannel(
+                observer, self._executor,
+                max_queue or self.max_queue, policy or self.policy)
+        else:
+            # registering again only changes the subscription and queue settings
+            with channel._condition:
+                channel.max_queue = max_queue or channel.max_queue
+                channel.policy = policy or channel.policy
+
+    def removeObserver(self, observer):
+        super().removeObserver(observer)
+        self._channels.pop(observer, None)
+
+    def channel(self, observer):
+        return self._channels[observer]
+
+    def notifyObservers(self):
+        frame = (time.perf_counter(), self._temperature, self._humidity, self._pressure)
+        for obs in self._targets():
+            channel = self._channels.get(obs)
+            if channel is not None:
+                channel.publish(frame)
+
+    def join(self, timeout=None):
+        """
+        Waits until every observer has received everything published so far
+        """
+        for channel in list(self._channels.values()):
+            channel.wait_idle(timeout)
+
+    def metrics(self):
+        return [channel.metrics() for channel in self._channels.values()]
+
+    def close(self):
+        self.join()
+        self._executor.shutdown()
+
+
+# Coalescing and rate limiting
+"""
+With sensors reporting many times a second, most observers only need the latest state.
+CoalescingWeatherData merges the readings arriving within `window` seconds into one notification
+(or, with window=None, into one per call to tick()). A reading held back by the window is sent by
+a timer when the window closes, unless a newer one gets there first; with trailing=False (e.g. for
+a clock that does not count real seconds) it waits for the next reading or tick() instead.
+On top of that, every observer can have
+- min_interval: at least this many seconds between two updates it receives
+- thresholds: e.g. {'pressure': 0.05} - only update it when one of these fields moved by more
+  than its epsilon since the values it last received
+"""
+class ObserverLimit:
+    fields = MEASUREMENTS
+
+    def __init__(self, min_interval=0.0, thresholds=None):
+        self.min_interval = min_interval
+        self.thresholds = thresholds or {}
+        for field in self.thresholds:
+            if field not in self.fields:
+                raise ValueError(f'Unknown measurement {field}')
+        self.last_time = None
+        self.last_values = None
+
+    def allows(self, now, values):
+        if self.last_time is not None and now - self.last_time < self.min_interval:
+            return False
+        if self.thresholds and self.last_values is not None:
+            return any(abs(values[field] - self.last_values[field]) > epsilon
+                       for field, epsilon in self.thresholds.items())
+        return True
+
+    def delivered(self, now, values):
+        self.last_time = now
+        self.last_values = values
+
+
+class CoalescingWeatherData(WeatherData):
+
+    def __init__(self, window=0.1, clock=time.monotonic, weak_observers=False, trailing=True):
+        super().__init__(weak_observers)
+        self.window = window
+        self.trailing = trailing
+        self._clock = clock
+        # the trailing flush runs on a timer thread
+        self._lock = threading.RLock()
+        self._timer = None
+        # weak keys, so limits never keep an observer alive
+        self._limits = weakref.WeakKeyDictionary()
+        self._pending = False
+        self._last_flush = None
+        self._started = clock()
+        self.readings = 0
+        self.notifications = 0
+        self.deliveries = 0
+        self.skipped = 0
+
+    def registerObserver(self, observer, fields=None, *, min_interval=0.0, thresholds=None):
+        # registering again only changes the subscription and limits,
+        # displays register themselves on creation
+        super().registerObserver(observer, fields)
+        self._limits[observer] = ObserverLimit(min_interval, thresholds)
+
+    def removeObserver(self, observer):
+        super().removeObserver(observer)
+        self._limits.pop(observer, None)
+
+    def setMeasurements(self, temperature, humidity, pressure):
+        with self._lock:
+            self._temperature = temperature
+            self._humidity = humidity
+            self._pressure = pressure
+            self.readings += 1
+            self._pending = True
+
+            if self.window is not None:
+                now = self._clock()
+                if self._last_flush is None or now - self._last_flush >= self.window:
+                    self.flush()
+                elif self.trailing and self._timer is None:
+                    timer = threading.Timer(self.window - (now - self._last_flush),
+                                            lambda: self._trailing_flush(timer))
+                    timer.daemon = True
+                    self._timer = timer
+                    timer.start()
+
+    def _trailing_flush(self, timer):
+        with self._lock:
+            # a flush since the timer was started has already sent the reading
+            if self._timer is timer:
+                self.flush()
+
+    def tick(self):
+        self.flush()
+
+    def flush(self):
+        """
+        Notifies observers of the latest measurements, if there is anything new
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending:
+                return
+            self._pending = False
+            self._last_flush = self._clock()
+            self.notifications += 1
+            self.measurementsChanged()
+
+    def close(self):
+        """
+        Stops the trailing flush timer, a reading it was holding back is not sent
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def notifyObservers(self):
+        now = self._clock()
+        values = {'temperature': self._temperature, 'humidity': self._humidity,
+                  'pressure': self._pressure}
+        for obs in self._targets():
+            limit = self._limits.get(obs)
+            if limit is not None and not limit.allows(now, values):
+                self.skipped += 1
+                continue
+            obs.update(self._temperature, self._humidity, self._pressure)
+            self.deliveries += 1
+            if limit is not None:
+                limit.delivered(now, values)
+
+    def rates(self):
+        """
+        Readings received vs notifications and observer updates sent, per second
+        """
+        elapsed = self._clock() - self._started
+        if not elapsed:
+            return {'readings': 0.0, 'notifications': 0.0, 'deliveries': 0.0}
+        return {
+            'readings': self.readings / elapsed,
+            'notifications': self.notifications / elapsed,
+            'deliveries': self.deliveries / elapsed,
+        }
+
+
 # Observers
 """
 The observer interface is implemented by all observers, so they all have to implement the update() method
@@ -104,8 +545,8 @@ class CurrentConditionsDisplay(Observer, DisplayElement):
         self.display()
 
     def display(self):
-        print("Current conditions: " + str(self._temperature) +
-                "F degrees and " + str(self._humidity) + " % humidity");
+        sinks.output.write("Current conditions: " + str(self._temperature) +
+                     "F degrees and " + str(self._humidity) + " % humidity")
 
 
 class StatisticsDisplay(Observer, DisplayElement):
@@ -133,7 +574,7 @@ class StatisticsDisplay(Observer, DisplayElement):
 
     def display(self):
         avg_temp = self._temp_sum / self._num_readings
-        print("Statistics Avg/Max/Min temperature = {0}/{1}/{2}".format(
+        sinks.output.write("Statistics Avg/Max/Min temperature = {0}/{1}/{2}".format(
             avg_temp, self._max_temp, self._min_temp))
 
 
@@ -152,13 +593,532 @@ class ForecastDisplay(Observer, DisplayElement):
         self.display()
 
     def display(self):
-        print("Forecast: "),
+        sinks.output.write("Forecast: ")
         if self._current_pressure > self._last_pressure:
-            print("Improving weather on the way!")
+            sinks.output.write("Improving weather on the way!")
         elif self._current_pressure == self._last_pressure:
-            print("More of the same")
+            sinks.output.write("More of the same")
         elif self._current_pressure < self._last_pressure:
-            print("Watch out for cooler, rainy weather")
+            sinks.output.write("Watch out for cooler, rainy weather")
+
+
+# Streaming statistics
+"""
+StatisticsDisplay can only give an average, a min and a max. The classes below give more
+without storing the readings: memory stays the same however long the station runs
+and every reading costs O(1).
+"""
+class RunningStats:
+    """
+    Count, mean, variance (Welford's algorithm), min and max
+    """
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stddev(self):
+        return math.sqrt(self.variance)
+
+
+class WindowedStats:
+    """
+    Aggregates over the last `window` seconds, kept in a ring of `buckets` time buckets.
+    The oldest bucket is reused once it falls out of the window, so results are
+    accurate to window / buckets seconds.
+    """
+    def __init__(self, window=3600.0, buckets=60, clock=time.monotonic):
+        self.window = window
+        self.bucket_width = window / buckets
+        self._clock = clock
+        self._epochs = [None] * buckets
+        self._counts = [0] * buckets
+        self._sums = [0.0] * buckets
+        self._mins = [math.inf] * buckets
+        self._maxs = [-math.inf] * buckets
+
+    def add(self, x):
+        epoch = int(self._clock() // self.bucket_width)
+        i = epoch % len(self._epochs)
+        if self._epochs[i] != epoch:
+            self._epochs[i] = epoch
+            self._counts[i] = 0
+            self._sums[i] = 0.0
+            self._mins[i] = math.inf
+            self._maxs[i] = -math.inf
+        self._counts[i] += 1
+        self._sums[i] += x
+        self._mins[i] = min(self._mins[i], x)
+        self._maxs[i] = max(self._maxs[i], x)
+
+    def _live(self):
+        oldest = int(self._clock() // self.bucket_width) - len(self._epochs) + 1
+        return [i for i, epoch in enumerate(self._epochs) if epoch is not None and epoch >= oldest]
+
+    @property
+    def count(self):
+        return sum(self._counts[i] for i in self._live())
+
+    @property
+    def mean(self):
+        live = self._live()
+        count = sum(self._counts[i] for i in live)
+        return sum(self._sums[i] for i in live) / count if count else None
+
+    @property
+    def min(self):
+        return min((self._mins[i] for i in self._live()), default=None)
+
+    @property
+    def max(self):
+        return max((self._maxs[i] for i in self._live()), default=None)
+
+
+class QuantileSketch:
+    """
+    Approximate quantile with the P-square algorithm (Jain & Chlamtac):
+    five markers are moved along with the data, no readings are stored
+    """
+    def __init__(self, p):
+        self.p = p
+        self._heights = []
+        self._positions = [0, 1, 2, 3, 4]
+        self._desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self._increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x):
+        q = self._heights
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(4) if q[i] <= x < q[i + 1])
+
+        n = self._positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        # move the middle markers towards their desired positions
+        for i in (1, 2, 3):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+
+    def _parabolic(self, i, d):
+        q, n = self._heights, self._positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+            (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    @property
+    def value(self):
+        q = self._heights
+        if not q:
+            return None
+        if len(q) < 5:
+            # exact while there are only a few readings
+            return q[min(len(q) - 1, int(self.p * len(q)))]
+        return q[2]
+
+
+class StreamingStatisticsDisplay(Observer, DisplayElement):
+
+    def __init__(self, weather_data, window=3600.0, quantiles=(0.5, 0.9, 0.99)):
+        self._stats = RunningStats()
+        self._window = WindowedStats(window)
+        self._quantiles = [QuantileSketch(p) for p in quantiles]
+        self._weather_data = weather_data
+
+        weather_data.registerObserver(self)
+
+    def update(self, temp, humidity, pressure):
+        self._stats.add(temp)
+        self._window.add(temp)
+        for sketch in self._quantiles:
+            sketch.add(temp)
+        self.display()
+
+    def display(self):
+        stats = self._stats
+        sinks.output.write("Statistics Avg/Max/Min/StdDev temperature = {0:.2f}/{1}/{2}/{3:.2f}".format(
+            stats.mean, stats.max, stats.min, stats.stddev))
+        sinks.output.write("Temperature " + ", ".join(
+            "p{0:g} = {1:.2f}".format(s.p * 100, s.value) for s in self._quantiles) +
+            ", last {0:g}s avg = {1:.2f}".format(self._window.window, self._window.mean))
+
+
+# Multi-process fan-out
+"""
+When the observers do real work in update() one interpreter cannot keep up.
+SharedMemoryWeatherData also publishes every measurement as a frame into a ring buffer
+in shared memory; observers run in worker processes and read the frames straight from it,
+nothing is pickled or copied through pipes.
+
+Layout: header (last sequence number, capacity, closed flag, number of readers),
+one cursor per reader (next sequence number it will read), then `capacity` frames of
+(sequence number, temperature, humidity, pressure).
+A frame's sequence number is cleared while it is being written and set last, so a reader
+that finds the expected number both before and after reading the values has a consistent frame.
+Waiting sides back off from yielding to sleeps of up to a millisecond, so idle readers do not
+spin a core. A reader whose process is gone is detached: its cursor is set past any sequence
+number, so the writer never waits for it again.
+"""
+def _backoff(delay):
+    # yields first, then sleeps twice as long every time, up to a millisecond
+    time.sleep(delay)
+    return min(max(delay * 2, 1e-5), 1e-3)
+
+
+class SharedMemoryRing:
+    HEADER = struct.Struct('=QQQQ')
+    CURSOR = struct.Struct('=Q')
+    FRAME = struct.Struct('=Qddd')
+    DETACHED = 2 ** 64 - 1
+
+    def __init__(self, name=None, capacity=1024, readers=0):
+        if name is None:
+            size = self.HEADER.size + readers * self.CURSOR.size + capacity * self.FRAME.size
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.HEADER.pack_into(self.shm.buf, 0, 0, capacity, 0, readers)
+            for reader in range(readers):
+                self.CURSOR.pack_into(self.shm.buf, self._cursor_offset(reader), 1)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        _, self.capacity, _, self.readers = self.HEADER.unpack_from(self.shm.buf, 0)
+        self._frames = self.HEADER.size + self.readers * self.CURSOR.size
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def _cursor_offset(self, reader):
+        return self.HEADER.size + reader * self.CURSOR.size
+
+    def _frame_offset(self, seq):
+        return self._frames + (seq - 1) % self.capacity * self.FRAME.size
+
+    @property
+    def head(self):
+        return self.HEADER.unpack_from(self.shm.buf, 0)[0]
+
+    @property
+    def closed(self):
+        return bool(self.HEADER.unpack_from(self.shm.buf, 0)[2])
+
+    def cursor(self, reader):
+        return self.CURSOR.unpack_from(self.shm.buf, self._cursor_offset(reader))[0]
+
+    def set_cursor(self, reader, seq):
+        self.CURSOR.pack_into(self.shm.buf, self._cursor_offset(reader), seq)
+
+    def detach(self, reader):
+        self.set_cursor(reader, self.DETACHED)
+
+    def publish(self, temperature, humidity, pressure, block=True, alive=None):
+        """
+        With block=True waits for the slowest reader instead of overwriting frames it has not read.
+        alive(reader) tells whether a reader is still there, the ones that are not get detached.
+        """
+        seq = self.head + 1
+        delay = 0.0
+        while block:
+            lagging = [r for r in range(self.readers) if seq - self.cursor(r) >= self.capacity]
+            if not lagging:
+                break
+            gone = [r for r in lagging if alive is not None and not alive(r)]
+            for reader in gone:
+                self.detach(reader)
+            if not gone:
+                delay = _backoff(delay)
+        offset = self._frame_offset(seq)
+        self.FRAME.pack_into(self.shm.buf, offset, 0, temperature, humidity, pressure)
+        self.FRAME.pack_into(self.shm.buf, offset, seq, temperature, humidity, pressure)
+        self.HEADER.pack_into(self.shm.buf, 0, seq, self.capacity, 0, self.readers)
+
+    def read(self, seq):
+        """
+        The frame with this sequence number, or None if it has been overwritten
+        """
+        offset = self._frame_offset(seq)
+        before = self.FRAME.unpack_from(self.shm.buf, offset)
+        after = self.FRAME.unpack_from(self.shm.buf, offset)[0]
+        if before[0] != seq or after != seq:
+            return None
+        return before[1:]
+
+    def close_stream(self):
+        self.HEADER.pack_into(self.shm.buf, 0, self.head, self.capacity, 1, self.readers)
+
+    def close(self):
+        self.shm.close()
+
+
+def _observe_frames(ring_name, reader, observer_class, observers, results):
+    """
+    Worker process: feeds every frame from the ring to `observers` local instances of observer_class
+    """
+    ring = SharedMemoryRing(ring_name)
+    weather_data = WeatherData()
+    for _ in range(observers):
+        observer_class(weather_data)
+    seq, delivered, skipped = ring.cursor(reader), 0, 0
+    delay = 0.0
+    while True:
+        head = ring.head
+        if seq > head:
+            if ring.closed:
+                break
+            delay = _backoff(delay)
+            continue
+        delay = 0.0
+        frame = ring.read(seq)
+        if frame is None:
+            # overwritten before we got to it, continue with the oldest frame still there
+            oldest = max(seq + 1, ring.head - ring.capacity + 1)
+            skipped += oldest - seq
+            seq = oldest
+        else:
+            weather_data.setMeasurements(*frame)
+            delivered += observers
+            seq += 1
+        ring.set_cursor(reader, seq)
+    results.put((reader, delivered, skipped))
+    ring.close()
+
+
+class SharedMemoryWeatherData(WeatherData):
+
+    def __init__(self, observer_class, processes=1, observers_per_process=1, capacity=1024,
+                 block=True, weak_observers=False):
+        super().__init__(weak_observers)
+        self.block = block
+        self._ring = SharedMemoryRing(capacity=capacity, readers=processes)
+        self._results = Queue()
+        self._workers = [
+            Process(target=_observe_frames,
+                    args=(self._ring.name, reader, observer_class, observers_per_process, self._results))
+            for reader in range(processes)]
+        for worker in self._workers:
+            worker.start()
+        self.delivered = 0
+        self.skipped = 0
+
+    def notifyObservers(self):
+        # observers in this process as usual, plus a frame for the worker processes
+        super().notifyObservers()
+        self._ring.publish(self._temperature, self._humidity, self._pressure, self.block,
+                           alive=lambda reader: self._workers[reader].is_alive())
+
+    def close(self, timeout=10.0):
+        """
+        Lets the workers finish the frames already published, then frees the shared memory.
+        Workers still running after `timeout` seconds are terminated; RuntimeError is raised
+        when a worker did not finish normally.
+        """
+        self._ring.close_stream()
+        deadline = time.monotonic() + timeout
+        try:
+            for worker in self._workers:
+                worker.join(max(0.0, deadline - time.monotonic()))
+                if worker.is_alive():
+                    worker.terminate()
+                    worker.join()
+            # one result from every worker that got to the end
+            for _ in range(sum(worker.exitcode == 0 for worker in self._workers)):
+                _, delivered, skipped = self._results.get(timeout=timeout)
+                self.delivered += delivered
+                self.skipped += skipped
+        finally:
+            self._ring.close()
+            self._ring.shm.unlink()
+        failed = [reader for reader, worker in enumerate(self._workers) if worker.exitcode != 0]
+        if failed:
+            raise RuntimeError(f'Worker processes {failed} did not finish normally')
+
+
+# An observer doing some real CPU work per update, for the benchmark
+class BusyObserver(Observer):
+
+    work = 2000
+
+    def __init__(self, weather_data):
+        weather_data.registerObserver(self)
+
+    def update(self, temp, humidity, pressure):
+        sum(i * i for i in range(self.work))
+
+
+def benchmark_shared_memory(frames=2000, observers=16, processes=(1, 4, os.cpu_count())):
+    """
+    Observer notifications per second with `observers` BusyObservers spread over worker processes
+    """
+    for n in sorted(set(processes)):
+        weather_data = SharedMemoryWeatherData(
+            BusyObserver, processes=n, observers_per_process=max(1, observers // n))
+        start = time.perf_counter()
+        for i in range(frames):
+            weather_data.setMeasurements(70 + i % 20, 65, 30.0)
+        weather_data.close()
+        elapsed = time.perf_counter() - start
+        print(f'{n:>3} processes: {weather_data.delivered / elapsed:>10,.0f} notifications/sec '
+              f'({weather_data.skipped} frames skipped)')
+
+
+# Replay
+"""
+Recorded traces of (timestamp, temperature, humidity, pressure) readings, replayed into a
+WeatherData in real time, faster, or as fast as possible.
+- CSV: a header row followed by one reading per row
+- binary: four native doubles per reading, read through mmap so large traces are not loaded
+"""
+TRACE_RECORD = struct.Struct('=dddd')
+
+
+def read_csv_trace(path):
+    with open(path, newline='') as fh:
+        rows = csv.reader(fh)
+        next(rows, None)
+        for row in rows:
+            yield tuple(float(value) for value in row)
+
+
+def read_binary_trace(path):
+    if not os.path.getsize(path):
+        return
+    with open(path, 'rb') as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for offset in range(0, len(mm) - TRACE_RECORD.size + 1, TRACE_RECORD.size):
+            yield TRACE_RECORD.unpack_from(mm, offset)
+
+
+def write_binary_trace(path, readings):
+    with open(path, 'wb') as fh:
+        for reading in readings:
+            fh.write(TRACE_RECORD.pack(*reading))
+
+
+def read_trace(path):
+    return read_csv_trace(path) if path.endswith('.csv') else read_binary_trace(path)
+
+
+class MeasurementReplay:
+
+    def __init__(self, weather_data, speed=None):
+        # speed=1.0 is real time, 10.0 ten times faster, None as fast as possible
+        self._weather_data = weather_data
+        self.speed = speed
+
+    def play(self, readings):
+        """
+        Feeds the readings into the weather data, returns how many there were
+        """
+        count = 0
+        start = first = None
+        for timestamp, temperature, humidity, pressure in readings:
+            if self.speed:
+                if first is None:
+                    start, first = time.perf_counter(), timestamp
+                delay = start + (timestamp - first) / self.speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            self._weather_data.setMeasurements(temperature, humidity, pressure)
+            count += 1
+        return count
+
+
+class ObserverBenchmark:
+    """
+    Measures, per observer type, the time from setMeasurements being called to each
+    observer's update returning, and the time spent inside its update - which gives
+    the updates per second the type could sustain on its own.
+    Observers registered with weather_data are instrumented when the benchmark is created;
+    meant for subjects that notify synchronously.
+    """
+    quantiles = (0.5, 0.9, 0.99)
+
+    def __init__(self, weather_data):
+        self._weather_data = weather_data
+        self._published = None
+        self._stats = {}
+        self._busy = {}
+        self._observers = list(weather_data._observers)
+
+        set_measurements = weather_data.setMeasurements
+
+        def timed_set_measurements(temperature, humidity, pressure):
+            self._published = time.perf_counter()
+            set_measurements(temperature, humidity, pressure)
+
+        weather_data.setMeasurements = timed_set_measurements
+        for obs in self._observers:
+            self._instrument(obs)
+
+    def _instrument(self, obs):
+        update = obs.update
+        name = type(obs).__name__
+        if name not in self._stats:
+            self._stats[name] = (RunningStats(), [QuantileSketch(p) for p in self.quantiles])
+            self._busy[name] = 0.0
+        stats, sketches = self._stats[name]
+
+        def timed_update(temp, humidity, pressure):
+            start = time.perf_counter()
+            update(temp, humidity, pressure)
+            end = time.perf_counter()
+            self._busy[name] += end - start
+            latency = end - self._published
+            stats.add(latency)
+            for sketch in sketches:
+                sketch.add(latency)
+
+        obs.update = timed_update
+
+    def report(self):
+        lines = []
+        for name, (stats, sketches) in self._stats.items():
+            if not stats.count:
+                lines.append(f'{name}: 0 updates')
+                continue
+            busy = self._busy[name]
+            rate = stats.count / busy if busy else 0.0
+            percentiles = ', '.join(f'p{s.p * 100:g} {s.value * 1e6:.1f}us' for s in sketches)
+            lines.append(f'{name}: {stats.count} updates, {rate:,.0f}/sec ({busy:.3f}s in update), '
+                         f'latency {percentiles}, max {stats.max * 1e6:.1f}us')
+        return '\n'.join(lines)
+
+    def restore(self):
+        del self._weather_data.setMeasurements
+        for obs in self._observers:
+            del obs.update
 
 
 if __name__ == '__main__':
@@ -172,3 +1132,60 @@ if __name__ == '__main__':
     weather_data.setMeasurements(80, 65, 30.4)
     weather_data.setMeasurements(82, 70, 29.2)
     weather_data.setMeasurements(78, 90, 29.2)
+
+    # same displays, delivered off the weather station's thread
+    async_weather_data = AsyncWeatherData(max_queue=8, policy=OverflowPolicy.COALESCE)
+    CurrentConditionsDisplay(async_weather_data)
+    async_weather_data.setMeasurements(80, 65, 30.4)
+    async_weather_data.setMeasurements(82, 70, 29.2)
+    async_weather_data.close()
+    for m in async_weather_data.metrics():
+        print(m)
+
+    # readings merged per tick, forecast only when the pressure really moves
+    coalescing_weather_data = CoalescingWeatherData(window=None)
+    forecast = ForecastDisplay(coalescing_weather_data)
+    coalescing_weather_data.registerObserver(forecast, thresholds={'pressure': 0.05})
+    for pressure in (30.4, 30.41, 30.42):
+        coalescing_weather_data.setMeasurements(80, 65, pressure)
+    coalescing_weather_data.tick()
+    coalescing_weather_data.setMeasurements(80, 65, 30.43)
+    coalescing_weather_data.tick()
+    print(f'{coalescing_weather_data.readings} readings, '
+          f'{coalescing_weather_data.deliveries} updates delivered')
+
+    # the forecast only cares about pressure
+    topic_weather_data = WeatherData()
+    forecast = ForecastDisplay(topic_weather_data)
+    topic_weather_data.registerObserver(forecast, fields=('pressure',))
+    CurrentConditionsDisplay(topic_weather_data)
+    topic_weather_data.setMeasurements(80, 65, 30.4)
+    topic_weather_data.setMeasurements(82, 70, 30.4)  # no forecast update
+
+    streaming_weather_data = WeatherData()
+    StreamingStatisticsDisplay(streaming_weather_data)
+    streaming_weather_data.setMeasurements(80, 65, 30.4)
+    streaming_weather_data.setMeasurements(82, 70, 29.2)
+    streaming_weather_data.setMeasurements(78, 90, 29.2)
+
+    # displays nobody holds on to unregister themselves
+    weak_weather_data = WeatherData(weak_observers=True)
+    CurrentConditionsDisplay(weak_weather_data)
+    print(f'{len(weak_weather_data._observers)} observers left')
+
+    # replay a recorded trace as fast as possible and time the displays
+    with tempfile.TemporaryDirectory() as trace_dir:
+        trace = os.path.join(trace_dir, 'trace.bin')
+        write_binary_trace(trace, ((i, 70 + i % 20, 65, 30.0 + i % 3) for i in range(10000)))
+        replay_weather_data = WeatherData()
+        CurrentConditionsDisplay(replay_weather_data)
+        StatisticsDisplay(replay_weather_data)
+        ForecastDisplay(replay_weather_data)
+        replay_benchmark = ObserverBenchmark(replay_weather_data)
+        sinks.set_output(sinks.NullSink())
+        MeasurementReplay(replay_weather_data).play(read_trace(trace))
+        sinks.set_output(sinks.ConsoleSink())
+        print(replay_benchmark.report())
+
+    if 'bench' in sys.argv[1:]:
+        benchmark_shared_memory()
@@ -1,4 +1,12 @@
 from abc import ABC, abstractmethod
+from array import array
+from functools import lru_cache
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sinks
+
 
 # Abstract Base Class for duck object
 class Duck(ABC):
@@ -25,7 +33,7 @@ class Duck(ABC):
         self.fly_behavior = fly_behavior
 
     def swim(self):
-        print("All ducks float, even decoys!!");
+        sinks.output.write("All ducks float, even decoys!!")
 
 
 # Quack behaviors
@@ -34,25 +42,42 @@ class QuackBehavior(ABC):
     def quack(self):
         pass
 
+    # the same quack for `count` ducks, behaviors can override it with something cheaper
+    def quack_many(self, count):
+        for _ in range(count):
+            self.quack()
+
 
 class Quack(QuackBehavior):
     def quack(self):
-        print("Quack")
+        sinks.output.write("Quack")
+
+    def quack_many(self, count):
+        sinks.output.write_many("Quack", count)
 
 
 class MuteQuack(QuackBehavior):
     def quack(self):
-        print("<< Silence >>")
+        sinks.output.write("<< Silence >>")
+
+    def quack_many(self, count):
+        sinks.output.write_many("<< Silence >>", count)
 
 
 class Squeak(QuackBehavior):
     def quack(self):
-        print("Squeak")
+        sinks.output.write("Squeak")
+
+    def quack_many(self, count):
+        sinks.output.write_many("Squeak", count)
 
 
 class FakeQuack(QuackBehavior):
     def quack(self):
-        print("Qwak")
+        sinks.output.write("Qwak")
+
+    def quack_many(self, count):
+        sinks.output.write_many("Qwak", count)
 
 
 # Fly behaviors
@@ -61,20 +86,33 @@ class FlyBehavior(ABC):
     def fly(self):
         pass
 
+    def fly_many(self, count):
+        for _ in range(count):
+            self.fly()
+
 
 class FlyWithWings(FlyBehavior):
     def fly(self):
-        print("I'm flying!!")
+        sinks.output.write("I'm flying!!")
+
+    def fly_many(self, count):
+        sinks.output.write_many("I'm flying!!", count)
 
 
 class FlyNoWay(FlyBehavior):
     def fly(self):
-        print("I can't fly")
+        sinks.output.write("I can't fly")
+
+    def fly_many(self, count):
+        sinks.output.write_many("I can't fly", count)
 
 
 class FlyRocketPowered(FlyBehavior):
     def fly(self):
-        print("I'm flying with a rocket!")
+        sinks.output.write("I'm flying with a rocket!")
+
+    def fly_many(self, count):
+        sinks.output.write_many("I'm flying with a rocket!", count)
 
 
 # Duck Class Implementations
@@ -85,7 +123,7 @@ class MallardDuck(Duck):
         self.quack_behavior = Quack()
 
     def display(self):
-        print("I'm a real Mallard duck")
+        sinks.output.write("I'm a real Mallard duck")
 
 
 class DecoyDuck(Duck):
@@ -95,7 +133,7 @@ class DecoyDuck(Duck):
         self.quack_behavior = MuteQuack()
 
     def display(self):
-        print("I'm a duck Decoy")
+        sinks.output.write("I'm a duck Decoy")
 
 
 class RubberDuck(Duck):
@@ -105,7 +143,7 @@ class RubberDuck(Duck):
         self.quack_behavior = Squeak()
 
     def display(self):
-        print("I'm a rubber duckie")
+        sinks.output.write("I'm a rubber duckie")
 
 
 class RedHeadDuck(Duck):
@@ -115,7 +153,7 @@ class RedHeadDuck(Duck):
         self.quack_behavior = Quack()
 
     def display(self):
-        print("I'm a real Red Headed duck")
+        sinks.output.write("I'm a real Red Headed duck")
 
 
 class ModelDuck(Duck):
@@ -125,10 +163,166 @@ class ModelDuck(Duck):
         self.quack_behavior = Quack()
 
     def display(self):
-        print("I'm a model duck")
-
-
+        sinks.output.write("I'm a model duck")
+
+
+
+# Precompiled dispatch
+# duck.fly() looks up fly_behavior, then its fly method, then calls it.
+# With this mixin the bound behavior method is cached on the instance as `fly`/`quack`,
+# and refreshed whenever a behavior is assigned (set_*_behavior or directly).
+class PrecompiledDispatch:
+    _dispatch = {'fly_behavior': 'fly', 'quack_behavior': 'quack'}
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        method = self._dispatch.get(name)
+        if method is None:
+            return
+        if value is None:
+            # back to the class' delegating method
+            self.__dict__.pop(method, None)
+        else:
+            super().__setattr__(method, getattr(value, method))
+
+
+@lru_cache(maxsize=None)
+def precompiled(duck_class):
+    """
+    precompiled(MallardDuck)() is a MallardDuck with precompiled dispatch
+    """
+    return type('Precompiled' + duck_class.__name__, (PrecompiledDispatch, duck_class), {})
+
+
+# Calls each strategy once per group of ducks sharing it instead of once per duck.
+# Behaviors here are stateless, so any instance of a behavior type can act for the whole group.
+class DuckFlock:
+    def __init__(self, ducks=()):
+        self.ducks = list(ducks)
+
+    def add(self, duck):
+        self.ducks.append(duck)
+
+    @staticmethod
+    def _groups(behaviors):
+        groups = {}
+        for behavior in behaviors:
+            group = groups.get(type(behavior))
+            if group is None:
+                groups[type(behavior)] = [behavior, 1]
+            else:
+                group[1] += 1
+        return groups.values()
+
+    def fly_all(self):
+        for behavior, count in self._groups(d.fly_behavior for d in self.ducks):
+            behavior.fly_many(count)
+
+    def quack_all(self):
+        for behavior, count in self._groups(d.quack_behavior for d in self.ducks):
+            behavior.quack_many(count)
+
+
+# Structure-of-arrays flock
+# Every duck class creates its own behavior objects, a million ducks means two million of them.
+# Here a duck is a row: its class and its behaviors are small integer codes in arrays,
+# and each behavior type has one shared (flyweight) instance. Swapping a behavior is an array write.
+# Codes are bytes, so a flock can use up to 256 duck classes and behavior types of each kind.
+# fly_all/quack_all run each behavior's batch method once for all the rows in a slice using it.
+class FlockArray:
+    def __init__(self):
+        self.duck_classes = []
+        self.prototypes = []
+        self.fly_behaviors = []
+        self.quack_behaviors = []
+        self.class_codes = array('B')
+        self.fly_codes = array('B')
+        self.quack_codes = array('B')
+
+    @staticmethod
+    def _code(table, item, key=type):
+        # index of the entry matching item, registering item if there is none
+        for code, known in enumerate(table):
+            if key(known) is key(item):
+                return code
+        table.append(item)
+        return len(table) - 1
+
+    def fly_code(self, behavior):
+        return self._code(self.fly_behaviors, behavior)
+
+    def quack_code(self, behavior):
+        return self._code(self.quack_behaviors, behavior)
+
+    def add(self, duck_class, count=1):
+        """
+        Adds count ducks of duck_class with its default behaviors, returns the first row
+        """
+        class_code = self._code(self.duck_classes, duck_class, key=lambda c: c)
+        if class_code == len(self.prototypes):
+            # one real duck per class tells us its default behaviors
+            self.prototypes.append(duck_class())
+        prototype = self.prototypes[class_code]
+        first = len(self)
+        self.class_codes.extend(array('B', [class_code]) * count)
+        self.fly_codes.extend(array('B', [self.fly_code(prototype.fly_behavior)]) * count)
+        self.quack_codes.extend(array('B', [self.quack_code(prototype.quack_behavior)]) * count)
+        return first
+
+    def __len__(self):
+        return len(self.class_codes)
+
+    def __getitem__(self, row):
+        return FlockDuck(self, range(len(self))[row])
+
+    def set_fly_behavior(self, fly_behavior, start=0, stop=None):
+        # sized like the slice it replaces, out of range and negative bounds included
+        rows = len(range(len(self))[start:stop])
+        self.fly_codes[start:stop] = array('B', [self.fly_code(fly_behavior)]) * rows
+
+    def set_quack_behavior(self, quack_behavior, start=0, stop=None):
+        rows = len(range(len(self))[start:stop])
+        self.quack_codes[start:stop] = array('B', [self.quack_code(quack_behavior)]) * rows
+
+    def fly_all(self, start=0, stop=None):
+        codes = self.fly_codes[start:stop]
+        for code, behavior in enumerate(self.fly_behaviors):
+            count = codes.count(code)
+            if count:
+                behavior.fly_many(count)
+
+    def quack_all(self, start=0, stop=None):
+        codes = self.quack_codes[start:stop]
+        for code, behavior in enumerate(self.quack_behaviors):
+            count = codes.count(code)
+            if count:
+                behavior.quack_many(count)
+
+
+# A Duck view of one row of a FlockArray, so code written against Duck keeps working
+class FlockDuck(Duck):
+    def __init__(self, flock, row):
+        self._flock = flock
+        self._row = row
+
+    @property
+    def fly_behavior(self):
+        return self._flock.fly_behaviors[self._flock.fly_codes[self._row]]
+
+    @fly_behavior.setter
+    def fly_behavior(self, fly_behavior):
+        self._flock.fly_codes[self._row] = self._flock.fly_code(fly_behavior)
+
+    @property
+    def quack_behavior(self):
+        return self._flock.quack_behaviors[self._flock.quack_codes[self._row]]
+
+    @quack_behavior.setter
+    def quack_behavior(self, quack_behavior):
+        self._flock.quack_codes[self._row] = self._flock.quack_code(quack_behavior)
 
+    def display(self):
+        self._flock.prototypes[self._flock.class_codes[self._row]].display()
 
 
 if __name__ == '__main__':
@@ -140,3 +334,19 @@ if __name__ == '__main__':
     model.fly()
     model.set_fly_behavior(FlyRocketPowered())
     model.fly()
+
+    fast = precompiled(ModelDuck)()
+    fast.fly()
+    fast.set_fly_behavior(FlyRocketPowered())
+    fast.fly()
+
+    flock = DuckFlock([MallardDuck(), RubberDuck(), RedHeadDuck(), model])
+    flock.fly_all()
+    flock.quack_all()
+
+    ducks = FlockArray()
+    ducks.add(MallardDuck, 2)
+    ducks.add(RubberDuck, 1)
+    ducks[2].display()
+    ducks[2].set_fly_behavior(FlyRocketPowered())
+    ducks.fly_all()
@@ -0,0 +1,122 @@
+"""
+Output sinks
+
+Behaviors, displays and pizzas used to call print directly, so every event paid for console I/O.
+They now write through a module level `output` sink which can be swapped with set_output():
+- ConsoleSink: print every line right away (the default)
+- BufferedSink: collect lines and write them to a stream in batches
+- NullSink: drop everything
+- RingBufferSink: keep the last `capacity` lines in memory
+"""
+
+import atexit
+import sys
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from itertools import repeat
+
+
+class OutputSink(ABC):
+    @abstractmethod
+    def write(self, line):
+        pass
+
+    # the same line `count` times, sinks can override it with something cheaper
+    def write_many(self, line, count):
+        for _ in range(count):
+            self.write(line)
+
+    def flush(self):
+        pass
+
+
+class ConsoleSink(OutputSink):
+    def write(self, line):
+        print(line)
+
+
+class BufferedSink(OutputSink):
+    # lines stay in memory until batch_size is reached or flush() is called;
+    # only the sink installed with set_output() is flushed at exit
+    def __init__(self, stream=None, batch_size=1024):
+        self._stream = stream
+        self.batch_size = batch_size
+        self._lines = []
+
+    @property
+    def stream(self):
+        # looked up late so redirected stdout is honoured
+        return self._stream or sys.stdout
+
+    def write(self, line):
+        self._lines.append(line)
+        if len(self._lines) >= self.batch_size:
+            self.flush()
+
+    def write_many(self, line, count):
+        self._lines.extend(repeat(line, count))
+        if len(self._lines) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._lines:
+            self.stream.write("\n".join(self._lines) + "\n")
+            self._lines = []
+        self.stream.flush()
+
+
+class NullSink(OutputSink):
+    def write(self, line):
+        pass
+
+    def write_many(self, line, count):
+        pass
+
+
+class RingBufferSink(OutputSink):
+    def __init__(self, capacity=1000):
+        self._lines = deque(maxlen=capacity)
+
+    def write(self, line):
+        self._lines.append(line)
+
+    def write_many(self, line, count):
+        self._lines.extend(repeat(line, min(count, self._lines.maxlen)))
+
+    def lines(self):
+        return list(self._lines)
+
+
+# where behaviors, displays and pizzas write, replace it with set_output()
+output = ConsoleSink()
+
+
+def set_output(sink):
+    global output
+    output = sink
+
+
+@atexit.register
+def _flush_output():
+    output.flush()
+
+
+def benchmark(events=200_000):
+    """
+    Per-event cost of each sink. The events go to stdout, the results to stderr,
+    so run it with stdout pointed at a terminal, a file or /dev/null.
+    """
+    sinks = [ConsoleSink(), BufferedSink(), NullSink(), RingBufferSink()]
+    for sink in sinks:
+        start = time.perf_counter()
+        for _ in range(events):
+            sink.write("Quack")
+        sink.flush()
+        elapsed = time.perf_counter() - start
+        print(f"{type(sink).__name__:<15} {elapsed / events * 1e9:>8.0f} ns/event",
+              file=sys.stderr)
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
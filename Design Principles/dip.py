@@ -1,7 +1,16 @@
 # Dependency Inversion Principle - High level modules should not depend on low level modules, 
 # instead they should depend on interfaces or abstractions
-from abc import abstractmethod
+from abc import ABC, abstractmethod
+from array import array
+import asyncio
+from collections import defaultdict, deque, namedtuple
 from enum import Enum
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
 
 
 class Relationship(Enum):
@@ -15,10 +24,36 @@ class Person:
         self.name = name
 
 
+# Person without a per-instance __dict__, and an immutable, hashable one
+class SlottedPerson:
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+
+FrozenPerson = namedtuple('FrozenPerson', 'name')
+
+
 class RelationshipBrowser:
     @abstractmethod
     def find_all_children_of(self, name): pass
 
+    # one round trip for many names, browsers that can do better override it
+    def find_all_children_of_many(self, names):
+        return {name: list(self.find_all_children_of(name)) for name in names}
+
+
+# same abstraction for browsers that are remote or slow
+class AsyncRelationshipBrowser(ABC):
+    @abstractmethod
+    async def find_all_children_of(self, name): pass
+
+    async def find_all_children_of_many(self, names):
+        names = list(names)
+        results = await asyncio.gather(*(self.find_all_children_of(n) for n in names))
+        return dict(zip(names, results))
+
 
 class Relationships(RelationshipBrowser):  # low-level
     relations = []
@@ -33,6 +68,257 @@ class Relationships(RelationshipBrowser):  # low-level
                 yield r[2].name
 
 
+# Another low-level module behind the same abstraction.
+# Edges are kept in adjacency maps: name -> relationship -> list of names,
+# so a lookup only touches the children of one person instead of every triple.
+class IndexedRelationships(RelationshipBrowser):
+    def __init__(self):
+        self.adjacency = defaultdict(lambda: defaultdict(list))
+
+    def add_parent_and_child(self, parent, child):
+        self.adjacency[parent.name][Relationship.PARENT].append(child.name)
+        self.adjacency[child.name][Relationship.CHILD].append(parent.name)
+
+    def related(self, name, relationship):
+        # .get so that lookups of unknown people do not create entries
+        edges = self.adjacency.get(name)
+        return edges.get(relationship, ()) if edges else ()
+
+    def find_all_children_of(self, name):
+        yield from self.related(name, Relationship.PARENT)
+
+    def find_all_parents_of(self, name):
+        yield from self.related(name, Relationship.CHILD)
+
+    def _walk(self, name, relationship, depth=None):
+        # BFS, the visited set makes sure everyone is reported once
+        # even when the family tree has several paths to the same person
+        visited = {name}
+        queue = deque([(name, 0)])
+        while queue:
+            current, level = queue.popleft()
+            if depth is not None and level >= depth:
+                continue
+            for other in self.related(current, relationship):
+                if other not in visited:
+                    visited.add(other)
+                    yield other
+                    queue.append((other, level + 1))
+
+    def find_descendants_of(self, name, depth=None):
+        """
+        Children, grandchildren, ... down to depth generations (all of them if depth is None)
+        """
+        return self._walk(name, Relationship.PARENT, depth)
+
+    def find_ancestors_of(self, name, depth=None):
+        return self._walk(name, Relationship.CHILD, depth)
+
+    def find_siblings_of(self, name):
+        seen = {name}
+        for parent in self.related(name, Relationship.CHILD):
+            for sibling in self.related(parent, Relationship.PARENT):
+                if sibling not in seen:
+                    seen.add(sibling)
+                    yield sibling
+
+
+# A low-level module for graphs that do not fit in memory.
+# The parent -> children edges are stored on disk in CSR (compressed sparse row) form
+# and the file is mmap-ed, so opening it deserializes nothing and the OS pages in
+# only the parts a query touches.
+#
+# Layout (native byte order):
+#   header        magic, number of names, number of edges, size of the name blob
+#   name_offsets  (names + 1) x uint64 - where each name starts in the blob
+#   row_offsets   (names + 1) x uint64 - children of name i are columns[row[i]:row[i + 1]]
+#   columns       edges x uint32       - child name ids
+#   name blob     UTF-8 names, sorted, so a name is found by binary search
+class MappedRelationships(RelationshipBrowser):
+    MAGIC = b'CSR1'
+    HEADER = struct.Struct('=4s4xQQQ')
+
+    def __init__(self, filename):
+        self._file = open(filename, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._names, self._edges, _ = self.HEADER.unpack_from(self._mm)
+        if magic != self.MAGIC:
+            self.close()
+            raise ValueError(f'{filename} is not a relationship graph file')
+
+        view = memoryview(self._mm)
+        pos = self.HEADER.size
+        self._name_offsets = view[pos:pos + (self._names + 1) * 8].cast('Q')
+        pos += (self._names + 1) * 8
+        self._row_offsets = view[pos:pos + (self._names + 1) * 8].cast('Q')
+        pos += (self._names + 1) * 8
+        self._columns = view[pos:pos + self._edges * 4].cast('I')
+        self._blob = pos + self._edges * 4
+        self._views = [self._name_offsets, self._row_offsets, self._columns, view]
+
+    @classmethod
+    def build(cls, filename, edges):
+        """
+        Writes (parent name, child name) pairs to filename in CSR format
+        """
+        edges = list(edges)
+        names = sorted({n.encode() for edge in edges for n in edge})
+        ids = {name.decode(): i for i, name in enumerate(names)}
+
+        # counting sort of the edges by parent
+        row_offsets = array('Q', bytes(8 * (len(names) + 1)))
+        for parent, _ in edges:
+            row_offsets[ids[parent] + 1] += 1
+        for i in range(len(names)):
+            row_offsets[i + 1] += row_offsets[i]
+        columns = array('I', bytes(4 * len(edges)))
+        fill = array('Q', row_offsets)
+        for parent, child in edges:
+            p = ids[parent]
+            columns[fill[p]] = ids[child]
+            fill[p] += 1
+
+        name_offsets = array('Q', [0])
+        for name in names:
+            name_offsets.append(name_offsets[-1] + len(name))
+
+        with open(filename, 'wb') as f:
+            f.write(cls.HEADER.pack(cls.MAGIC, len(names), len(edges), name_offsets[-1]))
+            name_offsets.tofile(f)
+            row_offsets.tofile(f)
+            columns.tofile(f)
+            f.write(b''.join(names))
+
+    def close(self):
+        # views into the map have to be released before it can be closed
+        for v in getattr(self, '_views', ()):
+            v.release()
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _raw_name(self, i):
+        # slicing the mmap itself copies just these bytes out
+        return self._mm[self._blob + self._name_offsets[i]:self._blob + self._name_offsets[i + 1]]
+
+    def _name_of(self, i):
+        return self._raw_name(i).decode()
+
+    def _id_of(self, name):
+        key = name.encode()
+        lo, hi = 0, self._names
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._raw_name(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._names and self._raw_name(lo) == key:
+            return lo
+        return None
+
+    def find_all_children_of(self, name):
+        i = self._id_of(name)
+        if i is None:
+            return
+        for j in range(self._row_offsets[i], self._row_offsets[i + 1]):
+            yield self._name_of(self._columns[j])
+
+
+# Local stand-ins for a remote browser: every round trip costs `latency` seconds
+class SlowRelationshipBrowser(RelationshipBrowser):
+    def __init__(self, browser, latency=0.01):
+        self.browser = browser
+        self.latency = latency
+        self.round_trips = 0
+
+    def _round_trip(self):
+        self.round_trips += 1
+        time.sleep(self.latency)
+
+    def find_all_children_of(self, name):
+        self._round_trip()
+        yield from list(self.browser.find_all_children_of(name))
+
+    def find_all_children_of_many(self, names):
+        self._round_trip()
+        return self.browser.find_all_children_of_many(names)
+
+
+class AsyncSlowRelationshipBrowser(AsyncRelationshipBrowser):
+    """
+    Lookups issued concurrently (in the same event loop iteration) are coalesced
+    into a single batched round trip. Every caller waits on its own future, so
+    cancelling one lookup does not affect the others asking for the same name.
+    """
+    def __init__(self, browser, latency=0.01):
+        self.browser = browser
+        self.latency = latency
+        self.round_trips = 0
+        # name -> the futures of the callers waiting for it
+        self._pending = {}
+        # batches in flight, the event loop only keeps weak references to tasks
+        self._flushes = set()
+
+    async def find_all_children_of(self, name):
+        loop = asyncio.get_running_loop()
+        if not self._pending:
+            flush = loop.create_task(self._flush(self._pending))
+            self._flushes.add(flush)
+            flush.add_done_callback(self._flushes.discard)
+        future = loop.create_future()
+        self._pending.setdefault(name, []).append(future)
+        return await future
+
+    async def _flush(self, batch):
+        # later lookups start a new batch
+        self._pending = {}
+        self.round_trips += 1
+        await asyncio.sleep(self.latency)
+        try:
+            results = self.browser.find_all_children_of_many(batch)
+        except Exception as e:
+            results, error = None, e
+        for name, futures in batch.items():
+            for future in futures:
+                # cancelled callers are skipped
+                if future.done():
+                    continue
+                if results is None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(results[name])
+
+
+def benchmark_batching(browser, names, latency=0.001):
+    names = list(names)
+
+    slow = SlowRelationshipBrowser(browser, latency)
+    start = time.perf_counter()
+    sequential = {n: list(slow.find_all_children_of(n)) for n in names}
+    print(f'{len(names)} sequential lookups: {time.perf_counter() - start:.3f}s, '
+          f'{slow.round_trips} round trips')
+
+    slow.round_trips = 0
+    start = time.perf_counter()
+    batched = slow.find_all_children_of_many(names)
+    print(f'1 batched lookup:       {time.perf_counter() - start:.3f}s, '
+          f'{slow.round_trips} round trips')
+
+    async_slow = AsyncSlowRelationshipBrowser(browser, latency)
+    start = time.perf_counter()
+    coalesced = asyncio.run(async_slow.find_all_children_of_many(names))
+    print(f'{len(names)} async lookups:      {time.perf_counter() - start:.3f}s, '
+          f'{async_slow.round_trips} round trips')
+
+    assert sequential == batched == coalesced
+
+
 class Research:
     # dependency on a low-level module directly
     # bad because strongly dependent on e.g. storage type
@@ -58,4 +344,26 @@ relationships = Relationships()
 relationships.add_parent_and_child(parent, child1)
 relationships.add_parent_and_child(parent, child2)
 
-Research(relationships)
\ No newline at end of file
+Research(relationships)
+
+# same high-level module, different low-level module
+indexed = IndexedRelationships()
+indexed.add_parent_and_child(parent, child1)
+indexed.add_parent_and_child(parent, child2)
+indexed.add_parent_and_child(child1, Person('Anna'))
+
+Research(indexed)
+print(f"John's descendants: {list(indexed.find_descendants_of('John'))}")
+print(f"Anna's ancestors: {list(indexed.find_ancestors_of('Anna'))}")
+print(f"Chris's siblings: {list(indexed.find_siblings_of('Chris'))}")
+
+# same high-level module, graph on disk
+with tempfile.TemporaryDirectory() as graph_dir:
+    graph_file = os.path.join(graph_dir, 'family.csr')
+    MappedRelationships.build(graph_file, [('John', 'Chris'), ('John', 'Matt'), ('Chris', 'Anna')])
+    with MappedRelationships(graph_file) as mapped:
+        Research(mapped)
+
+# many lookups, one round trip
+if 'bench' in sys.argv[1:]:
+    benchmark_batching(indexed, [f'Person {i}' for i in range(100)] + ['John', 'Chris'])
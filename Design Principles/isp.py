@@ -1,5 +1,9 @@
 # Interface Segregation Principle - Segregate into multiple interfaces
 from abc import abstractmethod
+from concurrent.futures import Future
+import queue
+import threading
+import time
 
 
 class Machine:
@@ -88,6 +92,271 @@ class MultiFunctionMachine(MultiFunctionDevice):
         self.scanner.scan(document)
 
 
+# Job pipeline
+# MultiFunctionMachine hands one document at a time to its devices and waits.
+# Here every capability of a device sits behind a bounded queue served by its own worker threads.
+# Submitting returns a Future right away; when a queue is full, submitting blocks (backpressure).
+class DeviceWorker:
+    # weight of the newest job in the moving average of job durations
+    latency_smoothing = 0.2
+
+    def __init__(self, name, operation, max_queue=16, workers=1, on_done=None):
+        self.name = name
+        self.operation = operation
+        self.jobs = queue.Queue(max_queue)
+        self.on_done = on_done
+        self.in_flight = 0
+        self.latency = 0.0
+        self.completed = 0
+        self.busy_time = 0.0
+        self.max_queue_depth = 0
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def reserve(self):
+        # a job is counted before it is queued, otherwise a fast worker could finish it first
+        with self._lock:
+            self.in_flight += 1
+
+    def submit(self, document, timeout=None, reserved=False):
+        if not reserved:
+            self.reserve()
+        future = Future()
+        try:
+            self.jobs.put((document, future), timeout=timeout)
+        except queue.Full:
+            self._release()
+            raise
+        with self._lock:
+            self.max_queue_depth = max(self.max_queue_depth, self.jobs.qsize())
+        return future
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+        if self.on_done is not None:
+            self.on_done(self)
+
+    def saturated(self):
+        # every worker busy and the queue full
+        return self.in_flight >= self.jobs.maxsize + len(self._threads)
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            document, future = job
+            if not future.set_running_or_notify_cancel():
+                # cancelled while queued, it still has to leave the count
+                self._release()
+                continue
+            start = time.perf_counter()
+            try:
+                future.set_result(self.operation(document))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                duration = time.perf_counter() - start
+                with self._lock:
+                    self.busy_time += duration
+                    self.completed += 1
+                    self.in_flight -= 1
+                    if self.completed == 1:
+                        # the first job is the only sample there is
+                        self.latency = duration
+                    else:
+                        self.latency += self.latency_smoothing * (duration - self.latency)
+                if self.on_done is not None:
+                    self.on_done(self)
+
+    def metrics(self):
+        elapsed = time.perf_counter() - self._started
+        with self._lock:
+            return {
+                'device': self.name,
+                'completed': self.completed,
+                'throughput': self.completed / elapsed if elapsed else 0.0,
+                'utilization': self.busy_time / (elapsed * len(self._threads)) if elapsed else 0.0,
+                'in_flight': self.in_flight,
+                'latency': self.latency,
+                'queue_depth': self.jobs.qsize(),
+                'max_queue_depth': self.max_queue_depth,
+            }
+
+    def close(self):
+        # one stop marker per worker, after the jobs already queued
+        for _ in self._threads:
+            self.jobs.put(None)
+        for thread in self._threads:
+            thread.join()
+
+
+class DocumentPipeline(MultiFunctionDevice):
+    def __init__(self, printer, scanner, max_queue=16, print_workers=1, scan_workers=1):
+        self.printer = DeviceWorker(type(printer).__name__ + '.print', printer.print,
+                                    max_queue, print_workers)
+        self.scanner = DeviceWorker(type(scanner).__name__ + '.scan', scanner.scan,
+                                    max_queue, scan_workers)
+
+    # single documents keep the synchronous MultiFunctionDevice behaviour
+    def print(self, document):
+        return self.printer.submit(document).result()
+
+    def scan(self, document):
+        return self.scanner.submit(document).result()
+
+    def print_many(self, documents):
+        return [self.printer.submit(d) for d in documents]
+
+    def scan_many(self, documents):
+        return [self.scanner.submit(d) for d in documents]
+
+    def photocopy_many(self, pages):
+        """
+        Scans every page and prints the result as soon as it is scanned,
+        so page N can be printing while page N + 1 is being scanned
+        """
+        copies = []
+        for page in pages:
+            copy = Future()
+            self.scanner.submit(page).add_done_callback(
+                lambda scanned, page=page, copy=copy: self._print_scanned(page, scanned, copy))
+            copies.append(copy)
+        return copies
+
+    def _print_scanned(self, page, scanned, copy):
+        if scanned.exception() is not None:
+            copy.set_exception(scanned.exception())
+            return
+        # the scanners in this module return nothing, then the page itself is printed
+        result = scanned.result()
+        printed = self.printer.submit(page if result is None else result)
+        printed.add_done_callback(
+            lambda done: copy.set_exception(done.exception()) if done.exception()
+            else copy.set_result(done.result()))
+
+    def metrics(self):
+        return [self.printer.metrics(), self.scanner.metrics()]
+
+    def close(self):
+        # scanning first, its callbacks still feed the printer
+        self.scanner.close()
+        self.printer.close()
+
+
+# Device pool
+# Many devices, jobs routed by capability. What a device can do is decided once, when it is
+# registered, by checking it against the segregated interfaces - a job asking for something
+# no registered device can do is rejected before it is queued anywhere.
+# Every device gets one queue and worker(s) for all it can do, so a Photocopier never prints
+# and scans at the same time (unless registered with more workers) and its load counts both.
+# Among the capable devices a job goes to the least loaded one ('least_loaded') or to the one
+# expected to finish it first ('latency'); devices without a finished job yet are assumed to be
+# as fast as the average of the others, and while no device has one, 'latency' is 'least_loaded'.
+# When every capable device is saturated (all its workers busy and its queue full),
+# submitting waits for room (backpressure) and raises queue.Full after `timeout`.
+class DevicePool:
+    interfaces = {'print': Printer, 'scan': Scanner}
+
+    def __init__(self, max_queue=4, strategy='least_loaded'):
+        if strategy not in ('least_loaded', 'latency'):
+            raise ValueError(f'Unknown strategy {strategy}')
+        self.max_queue = max_queue
+        self.strategy = strategy
+        self.routes = {capability: [] for capability in self.interfaces}
+        self.devices = []
+        self._room = threading.Condition()
+
+    def register(self, device, capabilities=None, workers=1):
+        """
+        Devices are routed by the interfaces they implement; legacy Machine devices
+        have to list the capabilities that really work, e.g. capabilities=['print']
+        """
+        if capabilities is None:
+            capabilities = [c for c, interface in self.interfaces.items()
+                            if isinstance(device, interface)]
+        if not capabilities:
+            raise TypeError(f'{type(device).__name__} implements none of '
+                            f'{", ".join(i.__name__ for i in self.interfaces.values())}')
+        for capability in capabilities:
+            if capability not in self.routes:
+                raise ValueError(f'Unknown capability {capability}')
+        worker = DeviceWorker(type(device).__name__, self._operation(device),
+                              self.max_queue, workers, on_done=self._job_done)
+        self.devices.append(worker)
+        for capability in capabilities:
+            self.routes[capability].append(worker)
+
+    @staticmethod
+    def _operation(device):
+        # jobs on a device's queue are (capability, document)
+        def run(job):
+            capability, document = job
+            return getattr(device, capability)(document)
+        return run
+
+    def _job_done(self, worker):
+        with self._room:
+            self._room.notify()
+
+    def _pick(self, workers):
+        candidates = [w for w in workers if not w.saturated()]
+        if self.strategy == 'latency':
+            sampled = [w.latency for w in candidates if w.completed]
+            if sampled:
+                estimate = sum(sampled) / len(sampled)
+                return min(candidates, key=lambda w: (w.in_flight + 1) *
+                           (w.latency if w.completed else estimate))
+        return min(candidates, key=lambda w: w.in_flight)
+
+    def submit(self, capability, document, timeout=None):
+        workers = self.routes.get(capability)
+        if not workers:
+            raise NotImplementedError(f'No registered device can {capability}!')
+        with self._room:
+            if not self._room.wait_for(lambda: any(not w.saturated() for w in workers), timeout):
+                raise queue.Full(f'All devices that can {capability} are busy')
+            worker = self._pick(workers)
+            worker.reserve()
+        # queued outside the lock: the put can wait for a worker to take its next job,
+        # and a worker finishing a job needs the lock to wake up waiting submitters
+        return worker.submit((capability, document), timeout, reserved=True)
+
+    def print(self, document, timeout=None):
+        return self.submit('print', document, timeout)
+
+    def scan(self, document, timeout=None):
+        return self.submit('scan', document, timeout)
+
+    def metrics(self):
+        return [w.metrics() for w in self.devices]
+
+    def close(self):
+        for w in self.devices:
+            w.close()
+
+
+pipeline = DocumentPipeline(MyPrinter(), Photocopier())
+for copy in pipeline.photocopy_many(['page 1', 'page 2', 'page 3']):
+    copy.result()
+pipeline.close()
+for m in pipeline.metrics():
+    print(m)
+
+pool = DevicePool()
+pool.register(MyPrinter())
+pool.register(Photocopier())
+pool.register(OldFashionedPrinter(), capabilities=['print'])
+for f in [pool.print(f'pooled page {i}') for i in range(4)]:
+    f.result()
+pool.close()
+for m in pool.metrics():
+    print(m['device'], m['completed'])
+
 printer = OldFashionedPrinter()
 printer.fax(123)  # nothing happens
 printer.scan(123)  # oops!
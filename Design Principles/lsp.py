@@ -1,6 +1,13 @@
 # Liskov Substituition Principle
 # If you have an interface that takes a base class
 # you should be able to stick a derived class and all methods should continue to work
+from array import array
+from itertools import repeat
+from operator import mul
+import sys
+import time
+
+
 class Rectangle:
     def __init__(self, width, height):
         self._height = height
@@ -43,6 +50,168 @@ class Square(Rectangle):
         _width = _height = value
 
 
+# Rectangle and Square without a per-instance __dict__.
+# Unlike Square above, SlottedSquare's setters do keep width == height.
+class SlottedRectangle:
+    __slots__ = ('_width', '_height')
+
+    def __init__(self, width, height):
+        self._height = height
+        self._width = width
+
+    @property
+    def area(self):
+        return self._width * self._height
+
+    def __str__(self):
+        return f'Width: {self.width}, height: {self.height}'
+
+    @property
+    def width(self):
+        return self._width
+
+    @width.setter
+    def width(self, value):
+        self._width = value
+
+    @property
+    def height(self):
+        return self._height
+
+    @height.setter
+    def height(self, value):
+        self._height = value
+
+
+class SlottedSquare(SlottedRectangle):
+    __slots__ = ()
+
+    def __init__(self, size):
+        SlottedRectangle.__init__(self, size, size)
+
+    @SlottedRectangle.width.setter
+    def width(self, value):
+        self._width = self._height = value
+
+    @SlottedRectangle.height.setter
+    def height(self, value):
+        self._width = self._height = value
+
+
+# Bulk geometry
+# One Rectangle object per shape means a property call per area and per resize.
+# RectangleArray keeps the shapes as columns (structure of arrays) and works on all rows at once
+# with C-level loops over the arrays. Rows flagged as squares keep width == height on every resize.
+class RectangleArray:
+    def __init__(self):
+        self.widths = array('d')
+        self.heights = array('d')
+        self.squares = array('B')
+
+    @classmethod
+    def from_shapes(cls, shapes):
+        shapes_array = cls()
+        for shape in shapes:
+            shapes_array.append(shape.width, shape.height, isinstance(shape, (Square, SlottedSquare)))
+        return shapes_array
+
+    def append(self, width, height, square=False):
+        if square and width != height:
+            raise ValueError('a square needs width == height')
+        self.widths.append(width)
+        self.heights.append(height)
+        self.squares.append(square)
+
+    def __len__(self):
+        return len(self.widths)
+
+    def square_rows(self, rows=slice(None)):
+        indices = range(len(self))[rows]
+        flags = self.squares[rows].tobytes()
+        pos = flags.find(1)
+        while pos != -1:
+            yield indices[pos]
+            pos = flags.find(1, pos + 1)
+
+    def areas(self):
+        return array('d', map(mul, self.widths, self.heights))
+
+    @staticmethod
+    def _per_row(value, n):
+        # one value for every row, or a sequence with a value per row
+        if isinstance(value, (int, float)):
+            return array('d', [value]) * n
+        values = array('d', value)
+        if len(values) != n:
+            raise ValueError(f'expected {n} values, got {len(values)}')
+        return values
+
+    def resize(self, width=None, height=None, scale=None, rows=slice(None)):
+        """
+        Resizes the rows selected by the `rows` slice (all of them by default).
+        width, height and scale are either one value for every selected row or a sequence
+        with one value per selected row; scale multiplies both sides and is applied first.
+        Squares take both sides from the last one given.
+        """
+        n = len(range(len(self))[rows])
+        if scale is not None:
+            factors = self._per_row(scale, n)
+            self.widths[rows] = array('d', map(mul, self.widths[rows], factors))
+            self.heights[rows] = array('d', map(mul, self.heights[rows], factors))
+        if width is not None:
+            self.widths[rows] = self._per_row(width, n)
+        if height is not None:
+            self.heights[rows] = self._per_row(height, n)
+        if width is not None or height is not None:
+            source = self.heights if height is not None else self.widths
+            for row in self.square_rows(rows):
+                self.widths[row] = self.heights[row] = source[row]
+
+    def check_use_it(self, height=10):
+        """
+        Bulk version of use_it without modifying the rows:
+        returns the rows where setting the height does not give area == width * height
+        """
+        new_widths = array('d', self.widths)
+        for row in self.square_rows():
+            new_widths[row] = height
+        expected = map(mul, self.widths, repeat(height))
+        actual = map(mul, new_widths, repeat(height))
+        return [row for row, (e, a) in enumerate(zip(expected, actual)) if e != a]
+
+
+def benchmark_rectangles(n=1_000_000):
+    shapes = [Rectangle(i % 7 + 1, i % 5 + 1) for i in range(n)]
+    shapes_array = RectangleArray.from_shapes(shapes)
+
+    start = time.perf_counter()
+    areas = [r.area for r in shapes]
+    objects = time.perf_counter() - start
+    start = time.perf_counter()
+    bulk_areas = shapes_array.areas()
+    print(f'{n:,} areas: objects {objects:.3f}s, RectangleArray {time.perf_counter() - start:.3f}s')
+    assert list(bulk_areas) == areas
+
+    start = time.perf_counter()
+    for r in shapes:
+        r.height = 10
+    objects = time.perf_counter() - start
+    start = time.perf_counter()
+    shapes_array.resize(height=10)
+    print(f'{n:,} resizes: objects {objects:.3f}s, RectangleArray {time.perf_counter() - start:.3f}s')
+
+    factors = [1 + i % 3 for i in range(n)]
+    start = time.perf_counter()
+    for r, factor in zip(shapes, factors):
+        r.width *= factor
+        r.height *= factor
+    objects = time.perf_counter() - start
+    start = time.perf_counter()
+    shapes_array.resize(scale=factors)
+    print(f'{n:,} scalings: objects {objects:.3f}s, RectangleArray {time.perf_counter() - start:.3f}s')
+    assert list(shapes_array.areas()) == [r.area for r in shapes]
+
+
 def use_it(rc):  # This function works only on a rectangle and no other inheriters of Rectangle (violated LSP)
     w = rc.width
     rc.height = 10  # unpleasant side effect
@@ -57,3 +226,11 @@ use_it(rc)
 
 sq = Square(5)
 use_it(sq)
+
+shapes = RectangleArray()
+shapes.append(2, 3)
+shapes.append(5, 5, square=True)
+print(f'Areas: {list(shapes.areas())}, use_it breaks for rows {shapes.check_use_it()}')
+
+if 'bench' in sys.argv[1:]:
+    benchmark_rectangles()
@@ -1,6 +1,14 @@
 # OCP = open for extension, closed for modification
 from enum import Enum
 from abc import *
+from array import array
+from collections import defaultdict, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+import os
+import random
+import sys
+import time
 
 
 class Color(Enum):
@@ -21,6 +29,21 @@ class Product:
         self.color = color
         self.size = size
 
+
+# Same fields without a per-instance __dict__, for catalogs with tens of millions of products.
+# Both work anywhere a Product does (filters, catalogs, stores).
+class SlottedProduct:
+    __slots__ = ('name', 'color', 'size')
+
+    def __init__(self, name, color, size):
+        self.name = name
+        self.color = color
+        self.size = size
+
+
+# immutable and hashable
+FrozenProduct = namedtuple('FrozenProduct', 'name color size')
+
 # Classes should be open for extension, closed for modification
 # This approach does not scale
     # state space explosion
@@ -56,6 +79,12 @@ class Specification(ABC):
     def __and__(self, other):
         return AndSpecification(self, other)
 
+    def __or__(self, other):
+        return OrSpecification(self, other)
+
+    def __invert__(self):
+        return NotSpecification(self)
+
 class Filter(ABC):
     @abstractmethod
     def filter(self, items, spec):
@@ -87,12 +116,536 @@ class AndSpecification(Specification):
             lambda spec: spec.is_satisfied(item), self.args))
 
 
+class OrSpecification(Specification):
+    def __init__(self, *args):
+        self.args = args
+
+    def is_satisfied(self, item):
+        return any(map(
+            lambda spec: spec.is_satisfied(item), self.args))
+
+
+class NotSpecification(Specification):
+    def __init__(self, spec):
+        self.spec = spec
+
+    def is_satisfied(self, item):
+        return not self.spec.is_satisfied(item)
+
+
 class BetterFilter(Filter):
     def filter(self, items, spec):
         for item in items:
             if spec.is_satisfied(item):
                 yield item
 
+# Name lookups get their own specification so the catalog can index them too
+class NameSpecification(Specification):
+    def __init__(self, name):
+        self.name = name
+
+    def is_satisfied(self, item):
+        return item.name == self.name
+
+
+# Indexed Catalog
+# BetterFilter has to look at every product for every query - O(catalog)
+# The catalog keeps an inverted index per attribute (value -> positions of products)
+# so indexable specifications are answered by intersecting sets instead of scanning
+class ProductCatalog:
+    indexed_attributes = ('name', 'color', 'size')
+
+    def __init__(self, products=()):
+        self.products = []
+        self.indexes = {attr: defaultdict(set) for attr in self.indexed_attributes}
+        for p in products:
+            self.add(p)
+
+    def add(self, product):
+        pos = len(self.products)
+        self.products.append(product)
+        for attr, index in self.indexes.items():
+            index[getattr(product, attr)].add(pos)
+
+    def __len__(self):
+        return len(self.products)
+
+    def __iter__(self):
+        return iter(self.products)
+
+    def lookup(self, attr, value):
+        # .get so that querying an unseen value does not grow the index
+        return self.indexes[attr].get(value, set())
+
+
+class IndexedFilter(Filter):
+    # Maps a specification type to the attribute it tests and the field holding the value
+    indexable = {
+        NameSpecification: ('name', 'name'),
+        ColorSpecification: ('color', 'color'),
+        SizeSpecification: ('size', 'size'),
+    }
+
+    def filter(self, catalog, spec):
+        if not isinstance(catalog, ProductCatalog):
+            # plain iterables have no index, behave like BetterFilter
+            yield from BetterFilter().filter(catalog, spec)
+            return
+
+        candidates = self.candidates(catalog, spec)
+        if candidates is None:
+            # nothing indexable in the spec, fall back to a full scan
+            yield from BetterFilter().filter(catalog, spec)
+            return
+
+        # candidates only narrow the search, the spec still has the final word
+        # (cheap for indexed terms, required for the non-indexable ones)
+        products = catalog.products
+        for pos in sorted(candidates):
+            if spec.is_satisfied(products[pos]):
+                yield products[pos]
+
+    def candidates(self, catalog, spec):
+        """
+        Returns the set of positions that may satisfy spec, or None if the spec cannot be indexed
+        """
+        key = self.indexable.get(type(spec))
+        if key is not None:
+            attr, field = key
+            return catalog.lookup(attr, getattr(spec, field))
+
+        if isinstance(spec, AndSpecification):
+            # intersect what we can, smallest set first, and leave the rest to the scan
+            sets = [self.candidates(catalog, arg) for arg in spec.args]
+            sets = sorted((s for s in sets if s is not None), key=len)
+            if not sets:
+                return None
+            return sets[0].intersection(*sets[1:])
+
+        if isinstance(spec, OrSpecification):
+            # a union is only useful if every branch is indexable
+            sets = [self.candidates(catalog, arg) for arg in spec.args]
+            if any(s is None for s in sets):
+                return None
+            return set().union(*sets)
+
+        return None
+
+
+# Query Planner
+# AndSpecification evaluates its terms in the order they were written.
+# The planner uses the catalog's index sizes as cardinality statistics and
+# rewrites the tree so the term most likely to short-circuit runs first:
+#   AND - most selective (fewest matches) first
+#   OR  - least selective (most matches) first
+class SpecificationPlanner:
+    # relative cost of evaluating a term on one item, unknown specs are assumed expensive
+    indexed_cost = 1
+    unknown_cost = 10
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+
+    def estimate(self, spec):
+        """
+        Estimated number of catalog rows satisfying spec (terms assumed independent)
+        """
+        total = len(self.catalog)
+        key = IndexedFilter.indexable.get(type(spec))
+        if key is not None:
+            attr, field = key
+            return len(self.catalog.lookup(attr, getattr(spec, field)))
+        if not total:
+            return 0
+        if isinstance(spec, AndSpecification):
+            fraction = 1.0
+            for arg in spec.args:
+                fraction *= self.estimate(arg) / total
+            return total * fraction
+        if isinstance(spec, OrSpecification):
+            miss = 1.0
+            for arg in spec.args:
+                miss *= 1 - self.estimate(arg) / total
+            return total * (1 - miss)
+        if isinstance(spec, NotSpecification):
+            return total - self.estimate(spec.spec)
+        # no statistics - assume it lets everything through
+        return total
+
+    def cost(self, spec):
+        if type(spec) in IndexedFilter.indexable:
+            return self.indexed_cost
+        if isinstance(spec, (AndSpecification, OrSpecification)):
+            return sum(self.cost(arg) for arg in spec.args)
+        if isinstance(spec, NotSpecification):
+            return self.cost(spec.spec)
+        return self.unknown_cost
+
+    def selectivity(self, spec):
+        total = len(self.catalog)
+        return self.estimate(spec) / total if total else 0.0
+
+    def plan(self, spec):
+        """
+        Returns an equivalent specification with combinator terms reordered
+        """
+        if isinstance(spec, AndSpecification):
+            args = [self.plan(arg) for arg in self._flatten(spec)]
+            # rank = cost / probability of short-circuiting (term is False)
+            args.sort(key=lambda a: self._rank(self.cost(a), 1 - self.selectivity(a)))
+            return AndSpecification(*args)
+        if isinstance(spec, OrSpecification):
+            args = [self.plan(arg) for arg in self._flatten(spec)]
+            # rank = cost / probability of short-circuiting (term is True)
+            args.sort(key=lambda a: self._rank(self.cost(a), self.selectivity(a)))
+            return OrSpecification(*args)
+        if isinstance(spec, NotSpecification):
+            return NotSpecification(self.plan(spec.spec))
+        return spec
+
+    @staticmethod
+    def _flatten(spec):
+        # a & b & c builds AND(AND(a, b), c) - pull nested terms of the same
+        # combinator up so they can all be reordered against each other
+        args = []
+        for arg in spec.args:
+            if type(arg) is type(spec):
+                args.extend(SpecificationPlanner._flatten(arg))
+            else:
+                args.append(arg)
+        return args
+
+    @staticmethod
+    def _rank(cost, short_circuit):
+        return cost / short_circuit if short_circuit else float('inf')
+
+    def explain(self, spec):
+        """
+        Plans spec, runs it over the catalog and returns a description of the plan
+        with estimated vs actual rows examined and matched by every node
+        """
+        plan = self.plan(spec)
+        root = _CountingSpecification.wrap(plan)
+        for _ in BetterFilter().filter(self.catalog, root):
+            pass
+        lines = []
+        self._explain_node(root, len(self.catalog), 0, lines)
+        return "\n".join(lines)
+
+    def _explain_node(self, node, estimated_in, depth, lines):
+        spec = node.spec
+        lines.append(f"{'  ' * depth}{_describe(spec)}: "
+                     f"examined est={estimated_in:.0f} actual={node.examined}, "
+                     f"matched est={estimated_in * self.selectivity(spec):.0f} actual={node.matched}")
+        if isinstance(spec, (AndSpecification, OrSpecification)):
+            reaching = estimated_in
+            for child in node.children:
+                self._explain_node(child, reaching, depth + 1, lines)
+                s = self.selectivity(child.spec)
+                # AND passes on the rows that matched, OR the ones that did not
+                reaching *= s if isinstance(spec, AndSpecification) else 1 - s
+        elif isinstance(spec, NotSpecification):
+            self._explain_node(node.children[0], estimated_in, depth + 1, lines)
+
+
+def _describe(spec):
+    if isinstance(spec, AndSpecification):
+        return 'AND'
+    if isinstance(spec, OrSpecification):
+        return 'OR'
+    if isinstance(spec, NotSpecification):
+        return 'NOT'
+    for field in ('name', 'color', 'size'):
+        if hasattr(spec, field):
+            value = getattr(spec, field)
+            return f"{type(spec).__name__}({getattr(value, 'name', value)})"
+    return type(spec).__name__
+
+
+# Used by explain() to count how many items reach each node of the plan
+class _CountingSpecification(Specification):
+    def __init__(self, spec, evaluated, children=()):
+        self.spec = spec
+        self.evaluated = evaluated
+        self.children = children
+        self.examined = 0
+        self.matched = 0
+
+    @classmethod
+    def wrap(cls, spec):
+        if isinstance(spec, (AndSpecification, OrSpecification)):
+            children = [cls.wrap(arg) for arg in spec.args]
+            return cls(spec, type(spec)(*children), children)
+        if isinstance(spec, NotSpecification):
+            child = cls.wrap(spec.spec)
+            return cls(spec, NotSpecification(child), [child])
+        return cls(spec, spec)
+
+    def is_satisfied(self, item):
+        self.examined += 1
+        result = self.evaluated.is_satisfied(item)
+        if result:
+            self.matched += 1
+        return result
+
+# Parallel Filter
+# For user-defined specifications that cannot be indexed or compiled the only option
+# left is to scan - but the scan can be spread over several processes.
+# Items are cut into chunks, each chunk is sent (pickled, together with the spec) to a worker,
+# and the worker sends back the offsets of the matching items, so the original objects are yielded.
+# At most max_pending chunks are in flight at any time which keeps memory bounded
+# even for an endless input iterable.
+def _matching_offsets(chunk, spec):
+    return [i for i, item in enumerate(chunk) if spec.is_satisfied(item)]
+
+
+class ParallelFilter(Filter):
+    def __init__(self, chunk_size=10_000, max_workers=None, max_pending=None, ordered=True):
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.ordered = ordered
+
+    def filter(self, items, spec):
+        workers = self.max_workers or os.cpu_count() or 1
+        # two chunks per worker keeps everyone busy while results are consumed
+        max_pending = self.max_pending or 2 * workers
+        with ProcessPoolExecutor(workers) as executor:
+            chunks = self._chunks(items)
+            # future -> its chunk, in submission order
+            pending = {}
+
+            def submit():
+                chunk = next(chunks, None)
+                if chunk is None:
+                    return False
+                pending[executor.submit(_matching_offsets, chunk, spec)] = chunk
+                return True
+
+            while len(pending) < max_pending and submit():
+                pass
+
+            while pending:
+                if self.ordered:
+                    # results come out in input order, waiting on the oldest chunk
+                    done = [next(iter(pending))]
+                else:
+                    # results come out as soon as any chunk is finished
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk = pending.pop(future)
+                    for offset in future.result():
+                        yield chunk[offset]
+                    submit()
+
+    def _chunks(self, items):
+        it = iter(items)
+        while True:
+            chunk = list(islice(it, self.chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+
+def benchmark_parallel(sizes=(10_000, 100_000, 1_000_000), work=(0, 2000)):
+    """
+    Compares BetterFilter with ParallelFilter for a cheap spec (work=0) and
+    for specs that burn some CPU per item, to show where process overhead pays off
+    """
+    for w in work:
+        spec = _BusySpecification(Color.BLUE, w)
+        for n in sizes:
+            products = [Product(str(i), random.choice(list(Color)), random.choice(list(Size)))
+                        for i in range(n)]
+            start = time.perf_counter()
+            serial = sum(1 for _ in BetterFilter().filter(products, spec))
+            serial_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            parallel = sum(1 for _ in ParallelFilter().filter(products, spec))
+            parallel_time = time.perf_counter() - start
+            assert serial == parallel
+            print(f'work={w:<4} {n:>10,} products: BetterFilter {serial_time:.3f}s, '
+                  f'ParallelFilter {parallel_time:.3f}s')
+
+
+# A stand-in for an expensive user-defined specification
+class _BusySpecification(Specification):
+    def __init__(self, color, work):
+        self.color = color
+        self.work = work
+
+    def is_satisfied(self, item):
+        sum(range(self.work))
+        return item.color == self.color
+
+
+# Columnar Store
+# Instead of one Product object per item, every attribute is a column.
+# Enum attributes are stored as one byte per product (the member's position in its Enum),
+# so a specification tree compiles into a mask expression evaluated in C:
+#   leaf     -> bytes.translate turns the column into a 0/1 byte per product
+#   AND/OR   -> & / | on the masks (as big ints)
+#   NOT      -> ^ with an all-ones mask
+# Only specifications the store does not understand fall back to calling is_satisfied per row.
+# Names are looked up through an index built on the first NameSpecification, holding one
+# position per name and an array of positions only for names that repeat.
+# A store filled with products keeps a reference to each, so filtering hands back the very
+# objects it was given; a store built from_columns has none and returns Product value copies.
+class ColumnarProductStore:
+    enum_columns = {'color': Color, 'size': Size}
+
+    def __init__(self, products=()):
+        self.names = []
+        self._name_index = None
+        self._items = []
+        self.columns = {attr: array('B') for attr in self.enum_columns}
+        self.members = {attr: list(enum) for attr, enum in self.enum_columns.items()}
+        self.codes = {attr: {m: i for i, m in enumerate(members)}
+                      for attr, members in self.members.items()}
+        for p in products:
+            self.append(p)
+
+    @classmethod
+    def from_columns(cls, names, **columns):
+        """
+        Builds a store straight from column data, e.g. from_columns(names, color=codes, size=codes)
+        """
+        store = cls()
+        store.names = list(names)
+        store._items = None
+        for attr, codes in columns.items():
+            store.columns[attr] = array('B', codes)
+        return store
+
+    @property
+    def name_index(self):
+        if self._name_index is None:
+            self._name_index = {}
+            for pos, name in enumerate(self.names):
+                self._index_name(name, pos)
+        return self._name_index
+
+    def _index_name(self, name, pos):
+        first = self._name_index.setdefault(name, pos)
+        if isinstance(first, array):
+            first.append(pos)
+        elif first != pos:
+            self._name_index[name] = array('Q', [first, pos])
+
+    def append(self, product):
+        if self._name_index is not None:
+            self._index_name(product.name, len(self.names))
+        self.names.append(product.name)
+        if self._items is not None:
+            self._items.append(product)
+        for attr, column in self.columns.items():
+            column.append(self.codes[attr][getattr(product, attr)])
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, pos):
+        if self._items is not None:
+            return self._items[pos]
+        # products are materialized on the way out only
+        return Product(self.names[pos],
+                       *(self.members[attr][self.columns[attr][pos]] for attr in ('color', 'size')))
+
+    def __iter__(self):
+        for pos in range(len(self)):
+            yield self[pos]
+
+    # masks
+
+    def _to_mask(self, flags):
+        return int.from_bytes(flags, 'big')
+
+    def all_mask(self):
+        return self._to_mask(b'\x01' * len(self))
+
+    def equals_mask(self, attr, value):
+        code = self.codes[attr].get(value)
+        table = bytearray(256)
+        if code is not None:
+            table[code] = 1
+        return self._to_mask(self.columns[attr].tobytes().translate(table))
+
+    def name_mask(self, name):
+        flags = bytearray(len(self))
+        positions = self.name_index.get(name, ())
+        for pos in (positions,) if isinstance(positions, int) else positions:
+            flags[pos] = 1
+        return self._to_mask(flags)
+
+    def scan_mask(self, spec):
+        return self._to_mask(bytes(spec.is_satisfied(p) for p in self))
+
+    def compile(self, spec):
+        """
+        Compiles a specification tree into a mask with one byte per product
+        """
+        if isinstance(spec, ColorSpecification):
+            return self.equals_mask('color', spec.color)
+        if isinstance(spec, SizeSpecification):
+            return self.equals_mask('size', spec.size)
+        if isinstance(spec, NameSpecification):
+            return self.name_mask(spec.name)
+        if isinstance(spec, AndSpecification):
+            mask = self.all_mask()
+            for arg in spec.args:
+                mask &= self.compile(arg)
+            return mask
+        if isinstance(spec, OrSpecification):
+            mask = 0
+            for arg in spec.args:
+                mask |= self.compile(arg)
+            return mask
+        if isinstance(spec, NotSpecification):
+            return self.compile(spec.spec) ^ self.all_mask()
+        return self.scan_mask(spec)
+
+    def positions(self, mask):
+        flags = mask.to_bytes(len(self), 'big')
+        pos = flags.find(1)
+        while pos != -1:
+            yield pos
+            pos = flags.find(1, pos + 1)
+
+
+class ColumnarFilter(Filter):
+    def filter(self, store, spec):
+        for pos in store.positions(store.compile(spec)):
+            yield store[pos]
+
+
+def benchmark_columnar(sizes=(1_000_000, 10_000_000), scan_limit=1_000_000):
+    """
+    Times large & blue on the columnar store against BetterFilter over Product objects.
+    BetterFilter needs every Product in memory so it is skipped above scan_limit.
+    """
+    spec = SizeSpecification(Size.LARGE) & ColorSpecification(Color.BLUE)
+    for n in sizes:
+        store = ColumnarProductStore.from_columns(
+            (str(i) for i in range(n)),
+            **{attr: random.choices(range(len(enum)), k=n)
+               for attr, enum in ColumnarProductStore.enum_columns.items()})
+
+        start = time.perf_counter()
+        found = sum(1 for _ in store.positions(store.compile(spec)))
+        columnar = time.perf_counter() - start
+        print(f'{n:>12,} products: columnar {columnar:.3f}s ({found:,} found)', end='')
+
+        if n <= scan_limit:
+            products = list(store)
+            start = time.perf_counter()
+            expected = sum(1 for _ in BetterFilter().filter(products, spec))
+            scan = time.perf_counter() - start
+            assert found == expected
+            print(f', BetterFilter {scan:.3f}s', end='')
+        print()
+
+
 # Driver Code
 if __name__ == '__main__':
     apple = Product('Apple', Color.GREEN, Size.SMALL)
@@ -126,4 +679,27 @@ if __name__ == '__main__':
     large_blue = large & ColorSpecification(Color.BLUE)
     for p in bf.filter(products, large_blue):
         print(f' - {p.name} is large and blue')
+
+    print('Large blue items (indexed):')
+    catalog = ProductCatalog(products)
+    inf = IndexedFilter()
+    for p in inf.filter(catalog, large_blue):
+        print(f' - {p.name} is large and blue')
+
+    print('Query plan for large & blue:')
+    planner = SpecificationPlanner(catalog)
+    print(planner.explain(large_blue))
+
+    print('Large blue items (columnar):')
+    store = ColumnarProductStore(products)
+    for p in ColumnarFilter().filter(store, large_blue):
+        print(f' - {p.name} is large and blue')
+
+    print('Large blue items (parallel):')
+    for p in ParallelFilter(chunk_size=1).filter(products, large_blue):
+        print(f' - {p.name} is large and blue')
+
+    if 'bench' in sys.argv[1:]:
+        benchmark_columnar()
+        benchmark_parallel()
     
\ No newline at end of file
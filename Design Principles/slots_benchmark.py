@@ -0,0 +1,79 @@
+# Memory and throughput of the dict-based value classes against their
+# __slots__ and frozen (namedtuple) variants.
+# python slots_benchmark.py [number of instances]
+import contextlib
+import importlib.util
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def load(path):
+    # the principle modules run their examples on import, keep them quiet
+    name = os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    with contextlib.redirect_stdout(io.StringIO()):
+        spec.loader.exec_module(module)
+    return module
+
+
+ocp = load(os.path.join(HERE, 'ocp.py'))
+dip = load(os.path.join(HERE, 'dip.py'))
+lsp = load(os.path.join(HERE, 'lsp.py'))
+factory = load(os.path.join(HERE, '..', 'Design Patterns', 'Factory', 'factory.py'))
+
+# (title, attribute read in the throughput test, {variant: constructor})
+CASES = [
+    ('Product', 'color', {
+        'dict': lambda i: ocp.Product(str(i), ocp.Color.RED, ocp.Size.SMALL),
+        'slots': lambda i: ocp.SlottedProduct(str(i), ocp.Color.RED, ocp.Size.SMALL),
+        'frozen': lambda i: ocp.FrozenProduct(str(i), ocp.Color.RED, ocp.Size.SMALL),
+    }),
+    ('Person', 'name', {
+        'dict': lambda i: dip.Person(str(i)),
+        'slots': lambda i: dip.SlottedPerson(str(i)),
+        'frozen': lambda i: dip.FrozenPerson(str(i)),
+    }),
+    ('Rectangle', 'area', {
+        'dict': lambda i: lsp.Rectangle(i, 2),
+        'slots': lambda i: lsp.SlottedRectangle(i, 2),
+    }),
+    ('Square', 'area', {
+        'dict': lambda i: lsp.Square(i),
+        'slots': lambda i: lsp.SlottedSquare(i),
+    }),
+    ('Point', 'x', {
+        'dict': lambda i: factory.Point(i, i),
+        'slots': lambda i: factory.SlottedPoint(i, i),
+        'frozen': lambda i: factory.FrozenPoint(i, i),
+    }),
+]
+
+
+def measure(make, attr, n):
+    tracemalloc.start()
+    start = time.perf_counter()
+    objects = [make(i) for i in range(n)]
+    created = time.perf_counter() - start
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for o in objects:
+        getattr(o, attr)
+    read = time.perf_counter() - start
+    return used / n, n / created, n / read
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    print(f'{"":<10}{"variant":<8}{"bytes/obj":>10}{"created/s":>14}{"reads/s":>14}')
+    for title, attr, variants in CASES:
+        for variant, make in variants.items():
+            size, create_rate, read_rate = measure(make, attr, n)
+            print(f'{title:<10}{variant:<8}{size:>10.1f}{create_rate:>14,.0f}{read_rate:>14,.0f}')
@@ -3,17 +3,34 @@
 # - Do not overload class with too many responsibilities
 # - A class should have a single reason to change and that change should be related to it's primary responsiobility
 
+from array import array
+import json
+import mmap
+import os
+import sys
+import tempfile
+import threading
+import tracemalloc
+import weakref
+
+
 class Journal:
     def __init__(self):
         self.entries = []
         self.count = 0
+        # a ChangeLog, only recorded once AppendOnlyPersistenceManager has saved the journal
+        self.changes = None
 
     def add_entry(self, text):
         self.entries.append(f"{self.count}: {text}")
         self.count += 1
+        if self.changes is not None:
+            self.changes.append(("+", text))
 
     def remove_entry(self, pos):
         del self.entries[pos]
+        if self.changes is not None:
+            self.changes.append(("-", pos))
 
     def __str__(self):
         return "\n".join(self.entries)
@@ -32,6 +49,106 @@ class Journal:
     def load_from_web(self, uri):
         pass
 
+# Same interface as Journal (changes included), but without one string object per entry:
+# the texts live back to back in a single UTF-8 buffer and entry i is
+# _text[_offsets[i]:_offsets[i + 1]]. The "{number}: " prefix is generated on output.
+# Removing an entry leaves its text in the buffer, so from the first removal on the
+# entries also need their own end offsets (_ends); the arrays holding them and the
+# numbers, which then stop matching positions, are created at that point. Once
+# removed text makes up half of the buffer it is reclaimed and _ends dropped again.
+class CompactJournal:
+    def __init__(self):
+        self._text = bytearray()
+        self._offsets = array("Q", [0])
+        self._ends = None
+        self._numbers = None
+        self._garbage = 0
+        self.count = 0
+        self.changes = None
+
+    def add_entry(self, text):
+        start = len(self._text)
+        self._text += text.encode()
+        if self._ends is None:
+            self._offsets.append(len(self._text))
+        else:
+            self._offsets.append(start)
+            self._ends.append(len(self._text))
+        if self._numbers is not None:
+            self._numbers.append(self.count)
+        self.count += 1
+        if self.changes is not None:
+            self.changes.append(("+", text))
+
+    def remove_entry(self, pos):
+        pos = range(len(self))[pos]
+        if self._ends is None:
+            self._ends = self._offsets[1:]
+            del self._offsets[-1]
+        if self._numbers is None:
+            self._numbers = array("Q", range(len(self)))
+        self._garbage += self._ends[pos] - self._offsets[pos]
+        # array deletions shift the rest in place
+        del self._offsets[pos]
+        del self._ends[pos]
+        del self._numbers[pos]
+        if self._garbage * 2 > len(self._text):
+            self._reclaim()
+        if self.changes is not None:
+            self.changes.append(("-", pos))
+
+    def _reclaim(self):
+        text = bytearray()
+        offsets = array("Q", [0])
+        for start, end in zip(self._offsets, self._ends):
+            text += self._text[start:end]
+            offsets.append(len(text))
+        self._text, self._offsets, self._ends, self._garbage = text, offsets, None, 0
+
+    def _span(self, pos):
+        if self._ends is None:
+            return self._offsets[pos], self._offsets[pos + 1]
+        return self._offsets[pos], self._ends[pos]
+
+    def __len__(self):
+        return len(self._offsets) - (self._ends is None)
+
+    def __getitem__(self, pos):
+        if isinstance(pos, slice):
+            return [self[i] for i in range(*pos.indices(len(self)))]
+        pos = range(len(self))[pos]
+        number = pos if self._numbers is None else self._numbers[pos]
+        start, end = self._span(pos)
+        text = self._text[start:end].decode()
+        return f"{number}: {text}"
+
+    def __iter__(self):
+        for pos in range(len(self)):
+            yield self[pos]
+
+    @property
+    def entries(self):
+        return list(self)
+
+    def __str__(self):
+        return "\n".join(self)
+
+
+def memory_per_entry(n=10_000_000):
+    """
+    Bytes per entry held by a Journal (list of strings) and a CompactJournal with n entries
+    """
+    for journal_type in (Journal, CompactJournal):
+        tracemalloc.start()
+        journal = journal_type()
+        for i in range(n):
+            journal.add_entry(f"Entry number {i}")
+        used, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{journal_type.__name__}: {used / n:.1f} bytes per entry ({n:,} entries)")
+        del journal
+
+
 # Follows SRP
 
 
@@ -42,6 +159,266 @@ class PersistenceManager:
         file.write(str(journal))
         file.close()
 
+    @staticmethod
+    def load_from_file(filename):
+        return MappedJournal(filename)
+
+
+# Streaming loader
+# Opens a journal written by save_to_file without reading it into memory.
+# A sidecar "<filename>.idx" holds the byte offset where every entry starts;
+# it is built once by scanning the mmap-ed file for newlines and reused while
+# the journal file keeps the same size and modification time. The index is
+# mmap-ed too, so journal[pos], slices and iteration only touch the pages
+# holding the entries they return and their offsets.
+class MappedJournal:
+    # size and st_mtime_ns of the journal file the index was built for, number of offsets
+    _header = 3
+
+    def __init__(self, filename):
+        self.filename = filename
+        stat = os.stat(filename)
+        self._size, self._mtime = stat.st_size, stat.st_mtime_ns
+        self._file = open(filename, "rb")
+        # an empty file cannot be mapped, and has no entries anyway
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self._size else None
+        self._index = None
+        self._offsets = self._load_index() if self._size else array("Q")
+
+    def _index_is_fresh(self, index_file):
+        try:
+            index_size = os.path.getsize(index_file)
+        except OSError:
+            return False
+        # anything shorter than a header, or not as long as its header says, is rebuilt
+        if index_size < 8 * self._header:
+            return False
+        with open(index_file, "rb") as fh:
+            header = array("Q")
+            header.frombytes(fh.read(8 * self._header))
+        size, mtime, count = header
+        return (size, mtime) == (self._size, self._mtime) and index_size == 8 * (self._header + count)
+
+    def _load_index(self):
+        index_file = self.filename + ".idx"
+        if not self._index_is_fresh(index_file):
+            offsets = array("Q", [0])
+            pos = self._mm.find(b"\n")
+            while pos != -1:
+                offsets.append(pos + 1)
+                pos = self._mm.find(b"\n", pos + 1)
+            # written next to it and moved into place, so a reader never sees a partial index
+            # and journals that have the old one mapped keep it
+            fd, tmp = tempfile.mkstemp(prefix=os.path.basename(index_file) + ".",
+                                       dir=os.path.dirname(os.path.abspath(index_file)))
+            try:
+                with open(fd, "wb") as fh:
+                    array("Q", [self._size, self._mtime, len(offsets)]).tofile(fh)
+                    offsets.tofile(fh)
+                os.replace(tmp, index_file)
+            except BaseException:
+                os.remove(tmp)
+                raise
+        with open(index_file, "rb") as fh:
+            self._index = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._index)[8 * self._header:].cast("Q")
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def _entry(self, pos):
+        start = self._offsets[pos]
+        # entries end right before the next one's newline, the last one at the end of the file
+        end = self._offsets[pos + 1] - 1 if pos + 1 < len(self._offsets) else self._size
+        return self._mm[start:end].decode()
+
+    def __getitem__(self, pos):
+        if isinstance(pos, slice):
+            return [self._entry(i) for i in range(*pos.indices(len(self)))]
+        if pos < 0:
+            pos += len(self)
+        if not 0 <= pos < len(self):
+            raise IndexError("journal index out of range")
+        return self._entry(pos)
+
+    def __iter__(self):
+        for pos in range(len(self)):
+            yield self._entry(pos)
+
+    def __str__(self):
+        return "\n".join(self)
+
+    def close(self):
+        if self._index is not None:
+            # the view has to go before the map it looks into
+            self._offsets.release()
+            self._index.close()
+        if self._mm is not None:
+            self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Append-only persistence
+# save_to_file rewrites the whole journal every time.
+# Here the first save of a journal through a manager writes a snapshot of it, which starts with
+# a "!" record that resets whatever the log held before. After that every save appends only the
+# changes made since that manager's last save (one JSON record per line, "-" records are
+# tombstones for removed entries). Writes go through a buffered file that is fsync-ed once
+# every `fsync_every` records. compact() rewrites the log as a snapshot.
+class ChangeLog:
+    """
+    The changes made to a journal, kept until every manager saving it has written them.
+    Each manager has its own cursor; managers that are garbage collected stop holding changes back.
+    """
+    def __init__(self):
+        self._changes = []
+        # position of _changes[0] among all the changes ever recorded
+        self._start = 0
+        self._cursors = weakref.WeakKeyDictionary()
+
+    def append(self, change):
+        if self._cursors:
+            self._changes.append(change)
+        elif self._changes:
+            self._changes = []
+
+    def __contains__(self, reader):
+        return reader in self._cursors
+
+    def attach(self, reader):
+        self._cursors[reader] = self._start + len(self._changes)
+
+    def read(self, reader):
+        """
+        The changes `reader` has not seen yet, which it is now considered to have seen
+        """
+        end = self._start + len(self._changes)
+        changes = self._changes[self._cursors[reader] - self._start:]
+        self._cursors[reader] = end
+        # drop what every reader has seen
+        seen = min(self._cursors.values()) - self._start
+        if seen:
+            del self._changes[:seen]
+            self._start += seen
+        return changes
+
+
+class AppendOnlyPersistenceManager:
+    def __init__(self, filename, fsync_every=100, buffer_size=64 * 1024):
+        self.filename = filename
+        self.fsync_every = fsync_every
+        self.buffer_size = buffer_size
+        self._file = open(filename, "a", encoding="utf-8", buffering=buffer_size)
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        # the thread writing a snapshot, and the records saved since it was taken
+        self._compaction = None
+        self._since_snapshot = None
+
+    def save(self, journal):
+        with self._lock:
+            if journal.changes is None:
+                journal.changes = ChangeLog()
+            if self not in journal.changes:
+                # first save through this manager: write what it holds, then only changes
+                records = self._snapshot_records(journal.entries, journal.count)
+                journal.changes.attach(self)
+            else:
+                records = [json.dumps(change) + "\n" for change in journal.changes.read(self)]
+            self._file.writelines(records)
+            if self._since_snapshot is not None:
+                self._since_snapshot.extend(records)
+            self._unsynced += len(records)
+            if self._unsynced >= self.fsync_every:
+                self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def flush(self):
+        with self._lock:
+            self._sync()
+
+    def close(self):
+        with self._lock:
+            self._sync()
+            self._file.close()
+
+    @staticmethod
+    def load(filename):
+        journal = Journal()
+        with open(filename, encoding="utf-8") as fh:
+            for line in fh:
+                op, value = json.loads(line)
+                if op == "!":
+                    journal.entries.clear()
+                    journal.count = 0
+                elif op == "+":
+                    journal.add_entry(value)
+                elif op == "-":
+                    journal.remove_entry(value)
+                elif op == "#":
+                    journal.count = value
+                elif op == "=":
+                    journal.entries.append(value)
+        return journal
+
+    @staticmethod
+    def _snapshot_records(entries, count):
+        return [json.dumps(["!", None]) + "\n", json.dumps(["#", count]) + "\n",
+                *(json.dumps(["=", entry]) + "\n" for entry in entries)]
+
+    def compact(self, journal, background=False):
+        """
+        Replaces the log with a snapshot of the journal, tombstones and removed entries disappear.
+        The snapshot is taken right away and written by a thread, which is returned with
+        background=True and waited for otherwise. Only one compaction runs at a time: while
+        one is in flight, compact() returns (or waits for) that one - whatever is saved meanwhile
+        is appended on top of its snapshot.
+        """
+        self.save(journal)
+        with self._lock:
+            if self._compaction is None:
+                self._since_snapshot = []
+                self._compaction = threading.Thread(
+                    target=self._write_snapshot, args=(list(journal.entries), journal.count))
+                self._compaction.start()
+            thread = self._compaction
+        if background:
+            return thread
+        thread.join()
+        return None
+
+    def _write_snapshot(self, entries, count):
+        directory, name = os.path.split(os.path.abspath(self.filename))
+        fd, tmp = tempfile.mkstemp(prefix=name + ".", suffix=".compact", dir=directory)
+        try:
+            with open(fd, "w", encoding="utf-8", buffering=self.buffer_size) as fh:
+                fh.writelines(self._snapshot_records(entries, count))
+                with self._lock:
+                    # saves made while the snapshot was being written go on top of it
+                    fh.writelines(self._since_snapshot)
+                    fh.flush()
+                    os.fsync(fh.fileno())
+                    self._file.close()
+                    os.replace(tmp, self.filename)
+                    self._file = open(self.filename, "a", encoding="utf-8", buffering=self.buffer_size)
+                    self._unsynced = 0
+        finally:
+            with self._lock:
+                self._since_snapshot = None
+                self._compaction = None
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
 
 j = Journal()
 j.add_entry("I cried today.")
@@ -49,9 +426,35 @@ j.add_entry("I ate a bug.")
 print(f"Journal entries:\n{j}\n")
 
 p = PersistenceManager()
-file = r'./temp.txt'
-p.save_to_file(j, file)
+with tempfile.TemporaryDirectory() as journal_dir:
+    file = os.path.join(journal_dir, 'temp.txt')
+    p.save_to_file(j, file)
+
+    # verify!
+    with open(file) as fh:
+        print(fh.read())
+
+    # random access without loading the file
+    with p.load_from_file(file) as mapped:
+        print(f"Last entry: {mapped[-1]}, {len(mapped)} entries")
+
+# incremental saves
+with tempfile.TemporaryDirectory() as log_dir:
+    log_file = os.path.join(log_dir, "journal.log")
+    store = AppendOnlyPersistenceManager(log_file, fsync_every=2)
+    store.save(j)
+    j.add_entry("I went for a walk.")
+    j.remove_entry(0)
+    store.save(j)  # appends one entry and one tombstone, not the whole journal
+    store.compact(j, background=True).join()
+    store.close()
+    print(f"Reloaded journal:\n{AppendOnlyPersistenceManager.load(log_file)}")
 
-# verify!
-with open(file) as fh:
-    print(fh.read())
+# same journal, one buffer instead of a string per entry
+cj = CompactJournal()
+cj.add_entry("I cried today.")
+cj.add_entry("I ate a bug.")
+cj.add_entry("I went for a walk.")
+cj.remove_entry(1)
+print(f"Compact journal entries:\n{cj}\n")
+memory_per_entry(10_000_000 if "bench" in sys.argv[1:] else 100_000)